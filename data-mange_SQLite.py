@@ -1,19 +1,305 @@
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from tkinter.scrolledtext import ScrolledText
 import re
 from datetime import datetime
 from collections import Counter
 import random
-from tkcalendar import DateEntry
 import sqlite3
 import csv
+import argparse
+import gzip
+import heapq
+import io
+import json
+import lzma
+import mmap
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import zipfile
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+try:
+    # ใช้เฉพาะหน้าจอ (GUI) คำสั่ง command line จึงรันบนเครื่องที่ไม่มี tkinter/tkcalendar ได้
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox
+    from tkinter.scrolledtext import ScrolledText
+    from tkcalendar import DateEntry
+except ImportError as e:
+    tk = None
+    _GUI_IMPORT_ERROR = e
+
+try:
+    # optional: ใช้นับเบอร์ซ้ำแบบ vectorized ถ้าไม่มีจะใช้ Counter แทน (ผลเหมือนกัน)
+    import numpy as np
+except ImportError:
+    np = None
+
+# ขนาดก้อนข้อมูลที่อ่านจากไฟล์ต่อครั้งตอนนำเข้า (ไบต์)
+IMPORT_CHUNK_SIZE = 4 * 1024 * 1024
+# อ่านไฟล์หลาย process เมื่อไฟล์รวมใหญ่กว่านี้ (ไฟล์เล็กเสียเวลาเปิด process มากกว่าที่ได้)
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+# ขนาดช่วงไบต์สูงสุดต่อ 1 งานของ worker (ไฟล์ใหญ่จะถูกแบ่งเป็นหลายช่วง)
+PARALLEL_SPLIT_BYTES = 64 * 1024 * 1024
+# รวมไฟล์ที่ใหญ่กว่านี้จะสลับบรรทัดผ่านไฟล์ชั่วคราวทีละถังขนาดนี้ แทนการโหลดทุกบรรทัดไว้ใน RAM
+COMBINE_BUCKET_BYTES = 32 * 1024 * 1024
+# ไฟล์บีบอัดที่อ่านเบอร์ได้โดยคลายระหว่างอ่าน (.zip ใช้ทุก member ที่เป็น .txt)
+COMPRESSED_SUFFIXES = (".gz", ".xz", ".zip")
+PHONE_FILE_TYPES = [("Phone Lists", "*.txt *.gz *.xz *.zip"), ("Text Files", "*.txt")]
+# ขนาดข้อมูลที่คลายแล้วที่อ่านจากไฟล์บีบอัดต่อครั้ง
+DECOMPRESS_READ_SIZE = 1024 * 1024
+# error ที่ได้จากการคลายไฟล์บีบอัดที่เสียหายหรือไม่ครบ (gzip.BadGzipFile เป็น OSError อยู่แล้ว)
+DECOMPRESS_ERRORS = (zipfile.BadZipFile, lzma.LZMAError, zlib.error, EOFError)
+# การนำเข้าแบบเรียงบนดิสก์: หน่วยความจำที่ใช้เรียงเบอร์ (ไบต์) และจำนวนไฟล์ run ที่รวมพร้อมกัน
+EXTERNAL_SORT_MEMORY = 256 * 1024 * 1024
+EXTERNAL_MERGE_FAN_IN = 64
+# key ของการเรียงเก็บเบอร์ (< 10^9 ใช้ 30 บิต) คู่กับลำดับบรรทัดหรือจำนวนครั้ง (34 บิต) ใน 64 บิต
+_EXTERNAL_PHONE_BITS = 30
+_EXTERNAL_SEQ_BITS = 34
+# งานนำเข้าจากไฟล์ commit และบันทึก checkpoint ทุกๆ ข้อมูลขนาดนี้ (ล่มแล้วทำต่อจากจุดนี้ได้)
+IMPORT_CHECKPOINT_BYTES = 16 * 1024 * 1024
+# แท็บจัดการข้อมูล: ดึงแถวทีละหน้าตามการเลื่อน และค้างแถวไว้ใน Treeview ไม่เกินจำนวนนี้
+MANAGE_PAGE_ROWS = 500
+MANAGE_WINDOW_ROWS = 5000
+
+# Table 1-16 (Table 16 สำหรับเก็บเบอร์ที่ซ้ำกันเองในไฟล์ที่นำเข้า)
+PHONE_TABLES = [f"phone_data_set_{i}" for i in range(1, 17)]
+DUPLICATE_TABLE = "phone_data_set_16"
+
+# คอลัมน์ของ Table เบอร์ในโครงสร้างปัจจุบัน ({phone_type} ตามโหมดการเก็บเบอร์)
+# ข้อมูลชุดข้อมูล (ชื่อ วันที่ แหล่งที่มา รายละเอียด ประเภท) อยู่ใน table datasets
+PHONE_TABLE_COLUMNS = """
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    phone_number {phone_type},
+    dataset_id INTEGER REFERENCES datasets (dataset_id),
+    is_exported INTEGER DEFAULT 0
+"""
+# Table 16 เก็บเบอร์ซ้ำในไฟล์แบบนับจำนวน: 1 แถวต่อ (เบอร์, ชุดข้อมูล) พร้อมจำนวนครั้งที่ซ้ำ
+DUPLICATE_TABLE_COLUMNS = PHONE_TABLE_COLUMNS.rstrip() + """,
+    occurrence_count INTEGER NOT NULL DEFAULT 1
+"""
+
+# ไฟล์ฐานข้อมูล และค่าตั้งต้นของ connection (ส่งค่าอื่นให้ connect_db ได้)
+DB_PATH = "phone_data.db"
+DB_CACHE_SIZE_KB = 64 * 1024          # page cache ต่อ connection (64 MB)
+DB_MMAP_SIZE = 256 * 1024 * 1024      # อ่านไฟล์ฐานข้อมูลผ่าน mmap สูงสุด 256 MB
+DB_BUSY_TIMEOUT_MS = 5000             # รอ lock จาก connection อื่นก่อนแจ้ง "database is locked"
+DB_JOURNAL_SIZE_LIMIT = 64 * 1024 * 1024  # ย่อไฟล์ -wal กลับหลัง checkpoint
+# cache ของ prepared statement ต่อ connection: 16 Table x คำสั่งต่อ Table ได้ถึง 16 แบบ
+DB_STATEMENT_CACHE_SIZE = len(PHONE_TABLES) * 16
+# หน่วยความจำสูงสุดของ cache ผลลัพธ์ query ในหน้าจอ (QueryCache) โดยประมาณ
+QUERY_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def connect_db(path=DB_PATH, cache_size_kb=DB_CACHE_SIZE_KB, mmap_size=DB_MMAP_SIZE,
+               busy_timeout_ms=DB_BUSY_TIMEOUT_MS, check_same_thread=True):
+    """เปิด connection ของฐานข้อมูลเบอร์ พร้อมตั้งค่า PRAGMA สำหรับงานข้อมูลจำนวนมาก
+
+    - journal_mode=WAL: อ่านได้ระหว่างเขียน และเขียนข้อมูลครั้งเดียวต่อ commit
+    - synchronous=NORMAL: ใน WAL ไม่ต้อง fsync ทุก commit (โปรแกรมล่มข้อมูลไม่เสีย
+      แต่ไฟดับอาจเสีย commit ล่าสุด)
+    - cache_size / mmap_size: เก็บหน้า index ของเบอร์ไว้ในหน่วยความจำ
+    - temp_store=MEMORY: temp table ตอนนำเข้าไม่ต้องเขียนลงไฟล์ชั่วคราว
+    """
+    conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000,
+                           cached_statements=DB_STATEMENT_CACHE_SIZE,
+                           check_same_thread=check_same_thread)
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA journal_size_limit = {DB_JOURNAL_SIZE_LIMIT}")
+    conn.execute(f"PRAGMA cache_size = -{int(cache_size_kb)}")
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+@contextmanager
+def bulk_transaction(conn):
+    """ทำงานเขียนจำนวนมากใน transaction เดียว: commit ครั้งเดียวตอนจบ, rollback ถ้าเกิด error
+
+    ใช้ BEGIN IMMEDIATE เพื่อจอง lock เขียนตั้งแต่ต้น ไม่ต้องไปชนกับ connection อื่นกลางทาง
+    """
+    if conn.in_transaction:
+        conn.commit()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        yield cursor
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
 
-def create_phone_data_tables():
-    conn = sqlite3.connect("phone_data.db")
+
+def data_version_token(conn):
+    """ค่าที่เปลี่ยนทุกครั้งที่ข้อมูลในฐานข้อมูลถูกแก้ไขหลังจากอ่านค่านี้
+
+    data_version เปลี่ยนเมื่อ connection อื่น (รวมถึงโปรแกรมอื่น) commit ส่วน total_changes
+    นับแถวที่ connection นี้เขียนเอง ใช้เทียบกับค่าที่อ่านจาก connection เดิมเท่านั้น
+    จึงเก็บ conn ไว้ในค่าด้วย (connection ที่เปิดใหม่จะไม่เท่ากับค่าเก่าเสมอ)
+    """
+    return conn, conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+
+class ConnectionManager:
+    """connection ที่เปิดค้างไว้ตลอดการใช้งานโปรแกรม: reader 1 ตัว และ writer 1 ตัว
+
+    ใน WAL หน้าจอยังอ่านผ่าน reader ได้ระหว่างที่งานเบื้องหลังเขียนผ่าน writer
+    แต่ละ connection ใช้ได้ทีละ thread (มี lock กั้น) และเก็บ prepared statement
+    ไว้ใน statement cache ของ sqlite3 ให้คำสั่งเดิมไม่ต้อง compile ใหม่ทุกครั้ง
+    ถ้าเกิด error ของฐานข้อมูล connection นั้นจะถูกปิดทิ้ง แล้วเปิดใหม่ในการใช้ครั้งถัดไป
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._connections = {"reader": None, "writer": None}
+        self._locks = {"reader": threading.RLock(), "writer": threading.RLock()}
+
+    @contextmanager
+    def reader(self):
+        """connection สำหรับอ่านอย่างเดียว (PRAGMA query_only)"""
+        with self._use("reader") as conn:
+            yield conn
+
+    @contextmanager
+    def writer(self):
+        """connection สำหรับเขียน: commit ให้เมื่อจบ block หรือ rollback ถ้าเกิด error"""
+        with self._use("writer") as conn:
+            yield conn
+
+    def close(self):
+        for role in self._connections:
+            with self._locks[role]:
+                self._discard(role)
+
+    @contextmanager
+    def _use(self, role):
+        with self._locks[role]:
+            conn = self._connections[role]
+            if conn is None:
+                conn = connect_db(self.path, check_same_thread=False)
+                if role == "reader":
+                    conn.execute("PRAGMA query_only = 1")
+                self._connections[role] = conn
+            try:
+                yield conn
+            except sqlite3.Error:
+                # connection อาจเสียไปแล้ว (ไฟล์ถูกล็อก/ถูกย้าย/ปิดไปแล้ว) เปิดใหม่ครั้งหน้า
+                self._discard(role)
+                raise
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            if conn.in_transaction:
+                conn.commit()
+
+    def _discard(self, role):
+        conn = self._connections[role]
+        self._connections[role] = None
+        if conn is not None:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+def _approx_size(value, sample=100):
+    """ขนาดโดยประมาณ (ไบต์) ของผลลัพธ์ query: list/tuple ของแถวหรือค่าเดี่ยว
+
+    list ยาวๆ ประมาณจากค่าเฉลี่ยของ sample ตัวแรก ไม่ต้องวัดทุกแถว
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)) and value:
+        head = value[:sample]
+        size += sum(_approx_size(item, sample) for item in head) * len(value) // len(head)
+    return size
+
+
+class QueryCache:
+    """LRU cache ของผลลัพธ์ query ที่หน้าจอเรียกซ้ำบ่อย (รายการชุดข้อมูล, สถิติ, หน้าแถว)
+
+    key ของแต่ละค่าคือ (table, generation ของ table, key ของ query) ทุกงานที่เขียน table
+    ต้องเรียก invalidate(table) หลังเขียนเสร็จ generation จะเพิ่มขึ้นและค่าเก่าของ table นั้น
+    ถูกทิ้ง ส่วนการเขียนจากโปรแกรมอื่น (เช่น CLI) ตรวจจาก PRAGMA data_version ของ
+    connection ที่อ่าน ถ้าเปลี่ยนจาก version ที่เห็นครั้งก่อนจะล้าง cache ทั้งหมด (รวมถึงหลังการเขียน
+    ของโปรแกรมเองซึ่ง invalidate ไปแล้ว เพราะแยกไม่ได้ว่ามีการเขียนจากที่อื่นปนมาด้วยหรือไม่)
+    ผลลัพธ์ที่ได้จาก cache ใช้ร่วมกันทุกครั้งที่เรียก ห้ามแก้ไข
+    """
+
+    def __init__(self, max_bytes=QUERY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = {}  # เรียงจากใช้นานที่สุดไปล่าสุด: full_key -> (value, size)
+        self._bytes = 0
+        self._generations = {}
+        # เพิ่มทุกครั้งที่ล้างทั้ง cache (ใช้แทน generation ของทุก table พร้อมกัน)
+        self._epoch = 0
+        self._data_version = None
+        self._lock = threading.Lock()
+
+    def get(self, conn, table, key, compute):
+        """คืนค่าของ compute(conn) สำหรับ (table, key) จาก cache หรือรัน query แล้วเก็บไว้"""
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with self._lock:
+            if self._data_version is not None and version != self._data_version:
+                self._clear()
+            self._data_version = version
+            full_key = self._full_key(table, key)
+            entry = self._entries.pop(full_key, None)
+            if entry is not None:
+                self._entries[full_key] = entry
+                return entry[0]
+
+        value = compute(conn)
+        size = _approx_size(value)
+        with self._lock:
+            # ไม่เก็บถ้า table ถูกเขียนระหว่าง query หรือค่าใหญ่เกินทั้ง cache
+            if full_key == self._full_key(table, key) and full_key not in self._entries \
+                    and size <= self.max_bytes:
+                self._entries[full_key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    self._bytes -= self._entries.pop(next(iter(self._entries)))[1]
+        return value
+
+    def invalidate(self, *tables):
+        """เรียกหลังเขียน tables (ไม่ระบุ = ทุก Table) ค่าเก่าของ table เหล่านั้นจะไม่ถูกใช้อีก"""
+        with self._lock:
+            if not tables:
+                self._clear()
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for full_key in [k for k in self._entries if k[0] == table]:
+                    self._bytes -= self._entries.pop(full_key)[1]
+            # ไม่ล้างค่า data_version ที่จำไว้ ถ้าล้าง get ครั้งถัดไปจะรับ version ใดก็ได้ รวมถึง
+            # version ที่มีการเขียนจากโปรแกรมอื่นปนมาด้วย การเขียนของโปรแกรมเองจึงทำให้ล้าง
+            # cache ทั้งหมดอีก 1 ครั้งตอน get ครั้งถัดไป
+
+    def _full_key(self, table, key):
+        return table, self._epoch, self._generations.get(table, 0), key
+
+    def _clear(self):
+        self._entries.clear()
+        self._bytes = 0
+        self._epoch += 1
+
+
+def create_phone_data_tables(path=DB_PATH):
+    conn = connect_db(path)
     cursor = conn.cursor()
 
-    # สร้าง Table 1-16 (Table 16 สำหรับเก็บเบอร์ซ้ำ)
+    # สร้าง Table 1-16 (Table 16 สำหรับเก็บเบอร์ซ้ำ) ในโครงสร้างแรกเริ่ม
+    # ฐานข้อมูลใหม่จะถูกปรับเป็นโครงสร้างปัจจุบันโดย SCHEMA_MIGRATIONS ด้านล่าง
     for i in range(1, 17):
         table_name = f"phone_data_set_{i}"
         cursor.execute(f"""
@@ -29,9 +315,2517 @@ def create_phone_data_tables():
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+        # index ของเบอร์ ให้ตรวจเบอร์ซ้ำได้โดยไม่ต้องสแกนทั้ง table
+        # (ไม่ใช้ UNIQUE เพราะการย้าย/คัดลอกชุดข้อมูลทำให้ table เดิมมีเบอร์ซ้ำได้อยู่แล้ว)
+        cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_{table_name}_phone
+                ON {table_name} (phone_number)
+            """)
     conn.commit()
+
+    # ปรับโครงสร้างฐานข้อมูลเดิมตามลำดับเวอร์ชัน (เก็บเวอร์ชันไว้ใน PRAGMA user_version)
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+    for number, migrate in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+        with bulk_transaction(conn) as migrate_cursor:
+            migrate(migrate_cursor)
+            migrate_cursor.execute(f"PRAGMA user_version = {number}")
     conn.close()
 
+
+# โหมดการเก็บเบอร์: "text" เก็บเป็นข้อความ 10 ตัว, "integer" เก็บเป็นตัวเลข
+# (ตัด 0 นำหน้า ใช้พื้นที่ 4 ไบต์แทน 10 ไบต์ทั้งใน table และ index)
+PHONE_COLUMN_TYPES = {"text": "TEXT", "integer": "INTEGER"}
+
+
+def phone_sql(column="phone_number"):
+    """นิพจน์ SQL ที่อ่านเบอร์กลับเป็นข้อความ 0XXXXXXXXX ได้ทั้งโหมด TEXT และ INTEGER
+
+    ใช้ในทุก SELECT ที่ต้องแสดงหรือส่งออกเบอร์ ส่วนการเขียนและการเปรียบเทียบ
+    ส่งเบอร์เป็นข้อความได้ตามเดิม เพราะคอลัมน์ INTEGER จะแปลงค่าให้เองตาม affinity
+    """
+    return (f"(CASE WHEN typeof({column}) = 'integer' "
+            f"THEN printf('%010d', {column}) ELSE {column} END)")
+
+
+def dataset_ids_sql(where="dataset_name = ?"):
+    """เงื่อนไข SQL เลือกแถวของ Table เบอร์ตามข้อมูลใน table datasets"""
+    return f"dataset_id IN (SELECT dataset_id FROM datasets WHERE {where})"
+
+
+def get_phone_storage(conn):
+    """อ่านโหมดการเก็บเบอร์ของฐานข้อมูล (ค่าเริ่มต้นคือ "text")"""
+    try:
+        row = conn.execute(
+            "SELECT value FROM app_settings WHERE key = 'phone_storage'").fetchone()
+    except sqlite3.OperationalError:
+        # ฐานข้อมูลที่ยังไม่มี app_settings
+        return "text"
+    return row[0] if row else "text"
+
+
+def _rebuild_phone_table(cursor, table_name, columns_sql, select_sql):
+    """สร้าง table_name ใหม่ด้วยคอลัมน์ columns_sql แล้วคัดลอกข้อมูลจาก select_sql
+
+    id และลำดับ AUTOINCREMENT คงเดิม ส่วน trigger ของ table เดิมจะหายไปด้วย
+    ผู้เรียกต้องสร้างทะเบียนเบอร์ใหม่ (และ trigger ของ index ค้นเบอร์ ถ้ามี) หลังจากนี้
+    """
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table_name,))
+    row = cursor.fetchone()
+    cursor.execute(f"CREATE TABLE {table_name}__new ({columns_sql})")
+    cursor.execute(f"INSERT INTO {table_name}__new {select_sql}")
+    cursor.execute(f"DROP TABLE {table_name}")
+    cursor.execute(f"ALTER TABLE {table_name}__new RENAME TO {table_name}")
+    if row:
+        cursor.execute(
+            "UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (row[0], table_name))
+    cursor.execute(f"CREATE INDEX idx_{table_name}_phone ON {table_name} (phone_number)")
+    cursor.execute(f"CREATE INDEX idx_{table_name}_dataset ON {table_name} (dataset_id)")
+
+
+def convert_phone_storage(conn, mode, progress=None):
+    """แปลงคอลัมน์เบอร์ของทุก Table และทะเบียนเบอร์ไปเป็นโหมด mode ("text"/"integer")
+
+    สร้าง table ใหม่แล้วคัดลอกข้อมูลทั้งหมด (id และลำดับ AUTOINCREMENT เหมือนเดิม)
+    จึงใช้เวลาตามขนาดฐานข้อมูล ควรสำรองไฟล์ phone_data.db ก่อนใช้งาน
+    """
+    if mode not in PHONE_COLUMN_TYPES:
+        raise ValueError(f"ไม่รู้จักโหมดการเก็บเบอร์: {mode}")
+    report = progress or (lambda percent, text="": None)
+    phone_type = PHONE_COLUMN_TYPES[mode]
+    # ตอนแปลงกลับเป็น TEXT ต้องเติม 0 นำหน้าคืน ส่วน INTEGER ให้ affinity แปลงเอง
+    phone_value = phone_sql() if mode == "text" else "phone_number"
+
+    with bulk_transaction(conn) as cursor:
+        for index, table_name in enumerate(PHONE_TABLES):
+            report(index / len(PHONE_TABLES) * 100, f"กำลังแปลง {table_name}...")
+            columns, extra = PHONE_TABLE_COLUMNS, ""
+            if table_name == DUPLICATE_TABLE:
+                columns, extra = DUPLICATE_TABLE_COLUMNS, ", occurrence_count"
+            _rebuild_phone_table(
+                cursor, table_name, columns.format(phone_type=phone_type),
+                f"SELECT id, {phone_value}, dataset_id, is_exported{extra} FROM {table_name}")
+
+        report(95, "กำลังสร้างทะเบียนเบอร์ใหม่...")
+        cursor.execute("DROP TABLE phone_registry")
+        _create_phone_registry(cursor, phone_type)
+        if has_search_index(conn):
+            # id และเบอร์ในรูป 0XXXXXXXXX เหมือนเดิม index ค้นเบอร์ใช้ต่อได้ เหลือแค่ trigger
+            for table_name in PHONE_TABLES:
+                _create_phone_search_triggers(cursor, table_name)
+        cursor.execute("""
+            INSERT INTO app_settings (key, value) VALUES ('phone_storage', ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value
+        """, (mode,))
+    report(100, "เสร็จสิ้น")
+
+
+def _migrate_phone_registry(cursor):
+    """v1: ทะเบียนเบอร์กลางว่าเบอร์แต่ละเบอร์อยู่ Table/ชุดข้อมูลไหนบ้าง"""
+    _create_phone_registry(cursor, "TEXT", dataset_column="dataset_name")
+
+
+def _migrate_app_settings(cursor):
+    """v2: ค่าตั้งของฐานข้อมูล เช่นโหมดการเก็บเบอร์ (phone_storage)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS app_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    cursor.execute(
+        "INSERT OR IGNORE INTO app_settings (key, value) VALUES ('phone_storage', 'text')")
+
+
+def _migrate_datasets(cursor):
+    """v3: แยกข้อมูลชุดข้อมูลออกมาเป็น table datasets ให้แถวเบอร์เก็บแค่ dataset_id
+
+    แต่ละชุดของ (dataset_name, receive_date, source, detail, data_type, created_at)
+    ที่ไม่ซ้ำกันจะกลายเป็น 1 แถวใน datasets
+    """
+    cursor.execute("""
+        CREATE TABLE datasets (
+            dataset_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dataset_name TEXT,
+            receive_date TEXT,
+            source TEXT,
+            detail TEXT,
+            data_type TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX idx_datasets_name ON datasets (dataset_name)")
+
+    metadata = "dataset_name, receive_date, source, detail, data_type, created_at"
+    cursor.execute(f"""
+        INSERT INTO datasets ({metadata})
+        SELECT {metadata} FROM (
+            {" UNION ".join(f"SELECT {metadata} FROM {table}" for table in PHONE_TABLES)}
+        )
+        ORDER BY created_at, dataset_name
+    """)
+
+    phone_type = PHONE_COLUMN_TYPES[get_phone_storage(cursor.connection)]
+    for table_name in PHONE_TABLES:
+        _rebuild_phone_table(
+            cursor, table_name, f"""
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                phone_number {phone_type},
+                dataset_id INTEGER REFERENCES datasets (dataset_id),
+                is_exported INTEGER DEFAULT 0
+            """, f"""
+                SELECT t.id, t.phone_number, d.dataset_id, t.is_exported
+                FROM {table_name} t
+                JOIN datasets d
+                  ON d.dataset_name IS t.dataset_name AND d.receive_date IS t.receive_date
+                 AND d.source IS t.source AND d.detail IS t.detail
+                 AND d.data_type IS t.data_type AND d.created_at IS t.created_at
+                ORDER BY t.id
+            """)
+
+    cursor.execute("DROP TABLE phone_registry")
+    _create_phone_registry(cursor, phone_type)
+
+
+def _create_phone_registry(cursor, phone_type, dataset_column="dataset_id"):
+    """สร้างทะเบียนเบอร์พร้อม trigger ของทุก Table และเติมจากข้อมูลที่มีอยู่
+
+    ข้อมูลในทะเบียนถูกดูแลโดย trigger ของทุก Table จึงตรงกับข้อมูลจริงเสมอ
+    ไม่ว่าจะนำเข้า ย้าย หรือลบจากส่วนไหนของโปรแกรม
+    """
+    dataset_type, missing = ("TEXT", "''") if dataset_column == "dataset_name" else ("INTEGER", "0")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS phone_registry (
+            phone_number {phone_type} NOT NULL,
+            table_no INTEGER NOT NULL,
+            {dataset_column} {dataset_type} NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (phone_number, table_no, {dataset_column})
+        ) WITHOUT ROWID
+    """)
+    for table_no, table_name in enumerate(PHONE_TABLES, start=1):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table_name}_registry_insert
+            AFTER INSERT ON {table_name}
+            WHEN NEW.phone_number IS NOT NULL
+            BEGIN
+                INSERT INTO phone_registry (phone_number, table_no, {dataset_column})
+                VALUES (NEW.phone_number, {table_no}, COALESCE(NEW.{dataset_column}, {missing}))
+                ON CONFLICT (phone_number, table_no, {dataset_column})
+                DO UPDATE SET row_count = row_count + 1;
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table_name}_registry_delete
+            AFTER DELETE ON {table_name}
+            WHEN OLD.phone_number IS NOT NULL
+            BEGIN
+                UPDATE phone_registry SET row_count = row_count - 1
+                WHERE phone_number = OLD.phone_number AND table_no = {table_no}
+                  AND {dataset_column} = COALESCE(OLD.{dataset_column}, {missing});
+                DELETE FROM phone_registry
+                WHERE phone_number = OLD.phone_number AND table_no = {table_no}
+                  AND {dataset_column} = COALESCE(OLD.{dataset_column}, {missing})
+                  AND row_count <= 0;
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table_name}_registry_update
+            AFTER UPDATE OF phone_number, {dataset_column} ON {table_name}
+            BEGIN
+                UPDATE phone_registry SET row_count = row_count - 1
+                WHERE phone_number = OLD.phone_number AND table_no = {table_no}
+                  AND {dataset_column} = COALESCE(OLD.{dataset_column}, {missing});
+                DELETE FROM phone_registry
+                WHERE phone_number = OLD.phone_number AND table_no = {table_no}
+                  AND {dataset_column} = COALESCE(OLD.{dataset_column}, {missing})
+                  AND row_count <= 0;
+                INSERT INTO phone_registry (phone_number, table_no, {dataset_column})
+                SELECT NEW.phone_number, {table_no}, COALESCE(NEW.{dataset_column}, {missing})
+                WHERE NEW.phone_number IS NOT NULL
+                ON CONFLICT (phone_number, table_no, {dataset_column})
+                DO UPDATE SET row_count = row_count + 1;
+            END
+        """)
+        # เติมทะเบียนจากข้อมูลที่มีอยู่แล้วในฐานข้อมูลเดิม
+        cursor.execute(f"""
+            INSERT INTO phone_registry (phone_number, table_no, {dataset_column}, row_count)
+            SELECT phone_number, {table_no}, COALESCE({dataset_column}, {missing}), COUNT(*)
+            FROM {table_name}
+            WHERE phone_number IS NOT NULL
+            GROUP BY phone_number, COALESCE({dataset_column}, {missing})
+        """)
+
+
+def _migrate_import_jobs(cursor):
+    """v4: table import_jobs เก็บ checkpoint ของงานนำเข้าจากไฟล์ ให้ทำต่อได้หลังล่ม/ยกเลิก
+
+    source_files เป็น JSON [[path, size, mtime_ns], ...] ส่วน byte_offset คือจำนวนไบต์
+    (นับรวมทุกไฟล์) ที่นำเข้าและ commit แล้ว
+    """
+    cursor.execute("""
+        CREATE TABLE import_jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_files TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            check_all_tables INTEGER NOT NULL DEFAULT 0,
+            dataset_id INTEGER REFERENCES datasets (dataset_id),
+            byte_offset INTEGER NOT NULL DEFAULT 0,
+            bytes_total INTEGER NOT NULL,
+            batch_count INTEGER NOT NULL DEFAULT 0,
+            phone_count INTEGER NOT NULL DEFAULT 0,
+            rejected_count INTEGER NOT NULL DEFAULT 0,
+            new_count INTEGER NOT NULL DEFAULT 0,
+            duplicate_count INTEGER NOT NULL DEFAULT 0,
+            db_duplicate_count INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'running',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _migrate_duplicate_counts(cursor):
+    """v5: รวมแถวซ้ำของ Table 16 เป็น 1 แถวต่อ (เบอร์, ชุดข้อมูล, สถานะส่งออก) พร้อม occurrence_count
+
+    แต่ละแถวใช้ id แรกของกลุ่ม ลำดับของเบอร์จึงเหมือนเดิม
+    """
+    phone_type = PHONE_COLUMN_TYPES[get_phone_storage(cursor.connection)]
+    _rebuild_phone_table(
+        cursor, DUPLICATE_TABLE, DUPLICATE_TABLE_COLUMNS.format(phone_type=phone_type), f"""
+            SELECT MIN(id), phone_number, dataset_id, is_exported, COUNT(*)
+            FROM {DUPLICATE_TABLE}
+            GROUP BY phone_number, dataset_id, is_exported
+            ORDER BY MIN(id)
+        """)
+    cursor.execute("DROP TABLE phone_registry")
+    _create_phone_registry(cursor, phone_type)
+
+
+def fts_trigram_available():
+    """SQLite ที่ใช้อยู่สร้าง FTS5 แบบ tokenize='trigram' ได้หรือไม่ (ต้องเป็น 3.34 ขึ้นไป)"""
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE probe USING fts5(value, tokenize='trigram')")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def search_table(table_name):
+    """ชื่อ FTS5 table ที่ใช้ค้นเบอร์บางส่วนของ table_name"""
+    return f"{table_name}_search"
+
+
+def _create_phone_search_triggers(cursor, table_name):
+    """trigger ที่คัดลอกเบอร์ (รูป 0XXXXXXXXX) ของ table_name ลง FTS5 table ของมันตาม id
+
+    FTS5 table เป็นแบบ contentless (content='') เก็บแค่ index ของ trigram จึงต้องลบด้วย
+    คำสั่ง 'delete' พร้อมเบอร์เดิม ทุกครั้งที่ _rebuild_phone_table สร้าง table ใหม่
+    ต้องเรียกฟังก์ชันนี้ซ้ำ เพราะ trigger ของ table เดิมหายไปด้วย
+    """
+    search = search_table(table_name)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table_name}_search_insert
+        AFTER INSERT ON {table_name}
+        WHEN NEW.phone_number IS NOT NULL
+        BEGIN
+            INSERT INTO {search} (rowid, phone_number)
+            VALUES (NEW.id, {phone_sql('NEW.phone_number')});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table_name}_search_delete
+        AFTER DELETE ON {table_name}
+        WHEN OLD.phone_number IS NOT NULL
+        BEGIN
+            INSERT INTO {search} ({search}, rowid, phone_number)
+            VALUES ('delete', OLD.id, {phone_sql('OLD.phone_number')});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table_name}_search_update
+        AFTER UPDATE OF phone_number ON {table_name}
+        BEGIN
+            INSERT INTO {search} ({search}, rowid, phone_number)
+            SELECT 'delete', OLD.id, {phone_sql('OLD.phone_number')}
+            WHERE OLD.phone_number IS NOT NULL;
+            INSERT INTO {search} (rowid, phone_number)
+            SELECT NEW.id, {phone_sql('NEW.phone_number')}
+            WHERE NEW.phone_number IS NOT NULL;
+        END
+    """)
+
+
+def _migrate_search_indexes(cursor):
+    """v6: index สำหรับฟิลเตอร์ของแท็บจัดการข้อมูล
+
+    - receive_date ของ datasets: ค้นช่วงวันที่ผ่าน B-tree
+    - datasets_search: FTS5 trigram ของชื่อชุดข้อมูล (external content ของ datasets)
+    - {table}_search: FTS5 trigram ของเบอร์ในแต่ละ Table ค้นเลขบางส่วนได้โดยไม่สแกนทั้ง table
+    (การค้นเบอร์ที่ขึ้นต้นด้วยเลขที่กรอกใช้ index ของ phone_number ที่มีอยู่แล้ว)
+    ถ้า SQLite ไม่มี FTS5 trigram จะสร้างแค่ index วันที่ แล้วค้นบางส่วนด้วย LIKE ตามเดิม
+    """
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_datasets_receive_date ON datasets (receive_date)")
+    if not fts_trigram_available():
+        return
+
+    cursor.execute("""
+        CREATE VIRTUAL TABLE datasets_search USING fts5(
+            dataset_name, content='datasets', content_rowid='dataset_id', tokenize='trigram'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER trg_datasets_search_insert AFTER INSERT ON datasets BEGIN
+            INSERT INTO datasets_search (rowid, dataset_name)
+            VALUES (NEW.dataset_id, NEW.dataset_name);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER trg_datasets_search_delete AFTER DELETE ON datasets BEGIN
+            INSERT INTO datasets_search (datasets_search, rowid, dataset_name)
+            VALUES ('delete', OLD.dataset_id, OLD.dataset_name);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER trg_datasets_search_update AFTER UPDATE OF dataset_name ON datasets BEGIN
+            INSERT INTO datasets_search (datasets_search, rowid, dataset_name)
+            VALUES ('delete', OLD.dataset_id, OLD.dataset_name);
+            INSERT INTO datasets_search (rowid, dataset_name)
+            VALUES (NEW.dataset_id, NEW.dataset_name);
+        END
+    """)
+    cursor.execute("INSERT INTO datasets_search (datasets_search) VALUES ('rebuild')")
+
+    for table_name in PHONE_TABLES:
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE {search_table(table_name)} USING fts5(
+                phone_number, content='', tokenize='trigram'
+            )
+        """)
+        _create_phone_search_triggers(cursor, table_name)
+        cursor.execute(f"""
+            INSERT INTO {search_table(table_name)} (rowid, phone_number)
+            SELECT id, {phone_sql()} FROM {table_name}
+            WHERE phone_number IS NOT NULL
+        """)
+
+
+SCHEMA_MIGRATIONS = [
+    _migrate_phone_registry,
+    _migrate_app_settings,
+    _migrate_datasets,
+    _migrate_import_jobs,
+    _migrate_duplicate_counts,
+    _migrate_search_indexes,
+]
+
+
+def has_search_index(conn):
+    """ฐานข้อมูลนี้มี FTS5 table ของฟิลเตอร์แท็บจัดการข้อมูลหรือไม่ (ดู _migrate_search_indexes)"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'datasets_search'").fetchone() is not None
+
+
+def find_phone_locations(conn, phone):
+    """หาว่าเบอร์นี้อยู่ Table/ชุดข้อมูลไหนบ้าง ด้วยการค้น index ของทะเบียนเบอร์ครั้งเดียว
+
+    คืนค่า list ของ (table_name, dataset_name, row_count)
+    """
+    cursor = conn.execute("""
+        SELECT r.table_no, COALESCE(d.dataset_name, ''), SUM(r.row_count)
+        FROM phone_registry r
+        LEFT JOIN datasets d ON d.dataset_id = r.dataset_id
+        WHERE r.phone_number = ?
+        GROUP BY r.table_no, d.dataset_name
+        ORDER BY r.table_no, d.dataset_name
+    """, (phone,))
+    return [(PHONE_TABLES[table_no - 1], dataset_name, row_count)
+            for table_no, dataset_name, row_count in cursor.fetchall()]
+
+
+def create_dataset(cursor, dataset):
+    """เพิ่มชุดข้อมูลใหม่ใน table datasets แล้วคืนค่า dataset_id
+
+    dataset คือ (dataset_name, receive_date, source, detail, data_type, created_at)
+    """
+    cursor.execute("""
+        INSERT INTO datasets (dataset_name, receive_date, source, detail, data_type, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, dataset)
+    return cursor.lastrowid
+
+
+def delete_unused_datasets(cursor):
+    """ลบชุดข้อมูลที่ไม่เหลือเบอร์อยู่ใน Table ใดแล้ว (ใช้ index ของ dataset_id)
+
+    ยกเว้นชุดข้อมูลของงานนำเข้าที่ยังไม่เสร็จ ซึ่งอาจยังไม่มีเบอร์ลงไปเลย
+    """
+    cursor.execute(f"""
+        DELETE FROM datasets
+        WHERE dataset_id NOT IN (
+            SELECT dataset_id FROM import_jobs
+            WHERE status != 'done' AND dataset_id IS NOT NULL
+        )
+        AND {" AND ".join(
+            f"NOT EXISTS (SELECT 1 FROM {table} t WHERE t.dataset_id = datasets.dataset_id)"
+            for table in PHONE_TABLES)}
+    """)
+
+
+def find_db_duplicates(conn, table, phone_numbers, check_all_tables=False, progress=None):
+    """หาเบอร์ใน phone_numbers ที่มีอยู่แล้วใน table ด้วยการค้น index ทีละก้อนใหญ่
+
+    แต่ละก้อนส่งเบอร์เป็น JSON array พารามิเตอร์เดียว แล้วให้ json_each join กับ index ของ
+    table ในคำสั่งเดียว ถ้า check_all_tables เป็น True จะตรวจกับทะเบียนเบอร์กลาง (ทุก Table) แทน
+    คืนค่า (duplicates, version) โดย duplicates เป็น PhoneArray ของเบอร์ที่ซ้ำ (เบอร์ละครั้ง
+    เรียงตามลำดับที่พบในไฟล์) และ version คือ data_version_token ก่อนเริ่มตรวจ ซึ่งส่งต่อให้
+    import_phone_numbers ที่ใช้ connection เดียวกันใช้ผลนี้ซ้ำได้ถ้าฐานข้อมูลยังไม่ถูกแก้ไข
+    """
+    report = progress or (lambda percent, text="": None)
+    # อ่าน version ก่อนตรวจ ถ้ามีใครเขียนระหว่างตรวจ version จะไม่ตรงและจะถูกตรวจใหม่ตอนบันทึก
+    version = data_version_token(conn)
+    existing_source = "phone_registry" if check_all_tables else f'"{table}"'
+    query = f"""
+        SELECT j.value
+        FROM json_each(?) j
+        WHERE EXISTS (
+            SELECT 1 FROM {existing_source} t
+            WHERE t.phone_number = j.value
+        )
+        ORDER BY j.key
+    """
+    found = {}
+    total = len(phone_numbers)
+    batch_size = 50000
+    for i in range(0, total, batch_size):
+        batch = phone_numbers[i:i + batch_size]
+        found.update(dict.fromkeys(
+            row[0] for row in conn.execute(query, ('["' + '","'.join(batch) + '"]',))))
+        report(((i + len(batch)) / total) * 100,
+               f"ตรวจสอบแล้ว {i + len(batch)} / {total} เบอร์")
+    return PhoneArray(found), version
+
+
+def _import_phone_batch(cursor, table, phone_numbers, dataset_id, check_all_tables=False,
+                        use_known_duplicates=False, continue_dataset=False, progress=None):
+    """บันทึกเบอร์ 1 ก้อนลง table ใน transaction ของ cursor ผ่าน temp table และ index
+
+    เบอร์ครั้งแรกของแต่ละหมายเลขที่ยังไม่มีใน table จะลง table ที่เลือก
+    ครั้งที่ 2, 3, ... ของเบอร์เดียวกันจะนับรวมเป็น occurrence_count ของแถวเดียวใน Table 16
+    ส่วนเบอร์ที่มีอยู่แล้วในฐานข้อมูลจะถูกข้ามทุกครั้งที่พบ (ตรวจกับทะเบียนเบอร์กลาง
+    ถ้า check_all_tables เป็น True)
+
+    use_known_duplicates: ใช้เบอร์ใน temp.import_known เป็นเบอร์ที่มีอยู่แล้ว แทนการค้น index
+    continue_dataset: ชุดข้อมูล dataset_id มีเบอร์จากก้อนก่อนหน้าอยู่แล้ว (งานนำเข้าที่แบ่ง
+    เป็นหลาย checkpoint) เบอร์ที่ก้อนก่อนๆ นำเข้าไว้แล้วจะนับเป็นเบอร์ซ้ำในไฟล์ ไม่ใช่ซ้ำในฐานข้อมูล
+    คืนค่า (new_count, duplicate_count, db_duplicate_count) โดย duplicate_count นับทุกครั้งที่ซ้ำ
+    """
+    report = progress or (lambda percent, text="": None)
+    cursor.execute("DROP TABLE IF EXISTS temp.import_phones")
+    cursor.execute("""
+        CREATE TEMP TABLE import_phones (
+            phone_number TEXT PRIMARY KEY,
+            first_seq INTEGER,
+            occurrences INTEGER,
+            in_db INTEGER DEFAULT 0,
+            in_dataset INTEGER DEFAULT 0
+        )
+    """)
+
+    # Step 1: นับเบอร์ซ้ำในไฟล์ (เบอร์ไม่ซ้ำ ลำดับที่พบครั้งแรก จำนวนครั้ง) (0-20%)
+    report(0, "กำลังตรวจสอบเบอร์ซ้ำในไฟล์...")
+    if not isinstance(phone_numbers, PhoneArray):
+        phone_numbers = PhoneArray(phone_numbers)
+    unique, first, counts = phone_numbers.counts()
+
+    # Step 2: พักเบอร์ไม่ซ้ำไว้ใน temp table แล้วเช็คกับ table ผ่าน index (20-50%)
+    total = len(unique)
+    batch_size = 50000
+    report(20, f"เตรียมข้อมูล 0 / {total} เบอร์")
+    for i in range(0, total, batch_size):
+        end = min(i + batch_size, total)
+        cursor.executemany(
+            "INSERT INTO import_phones (phone_number, first_seq, occurrences) VALUES (?, ?, ?)",
+            zip(map("{:010d}".format, _as_list(unique[i:end])),
+                _as_list(first[i:end]), _as_list(counts[i:end])))
+        report(20 + end / total * 15, f"เตรียมข้อมูล {end} / {total} เบอร์")
+    report(35, "กำลังตรวจสอบเบอร์ซ้ำในฐานข้อมูล...")
+    table_no = PHONE_TABLES.index(table) + 1
+    if use_known_duplicates:
+        # ใช้ผลตรวจตอนโหลดไฟล์ ไม่ต้องค้น index ของ table ทีละเบอร์อีกรอบ
+        cursor.execute("""
+            UPDATE import_phones SET in_db = 1
+            WHERE phone_number IN (SELECT phone_number FROM import_known)
+        """)
+    elif continue_dataset:
+        # ไม่นับแถวของชุดข้อมูลนี้เองที่ก้อนก่อนหน้านำเข้าไว้ (ค้นจาก primary key ของทะเบียนเบอร์)
+        table_filter = "" if check_all_tables else f"AND r.table_no = {table_no}"
+        cursor.execute(f"""
+            UPDATE import_phones SET in_db = 1
+            WHERE EXISTS (
+                SELECT 1 FROM phone_registry r
+                WHERE r.phone_number = import_phones.phone_number {table_filter}
+                  AND r.dataset_id <> ?
+            )
+        """, (dataset_id,))
+    else:
+        existing_source = "phone_registry" if check_all_tables else f'"{table}"'
+        cursor.execute(f"""
+            UPDATE import_phones SET in_db = 1
+            WHERE EXISTS (
+                SELECT 1 FROM {existing_source} t
+                WHERE t.phone_number = import_phones.phone_number
+            )
+        """)
+    if continue_dataset:
+        cursor.execute(f"""
+            UPDATE import_phones SET in_dataset = 1
+            WHERE in_db = 0 AND EXISTS (
+                SELECT 1 FROM phone_registry r
+                WHERE r.phone_number = import_phones.phone_number
+                  AND r.table_no = {table_no} AND r.dataset_id = ?
+            )
+        """, (dataset_id,))
+    cursor.execute(
+        "SELECT COALESCE(SUM(occurrences), 0) FROM import_phones WHERE in_db = 1")
+    db_duplicate_count = cursor.fetchone()[0]
+
+    # Step 3: เบอร์ครั้งแรกที่ยังไม่มีในฐานข้อมูลลง Table ปกติ (50-80%)
+    report(50, "กำลังนำเข้า Table ปกติ...")
+    cursor.execute(f"""
+        INSERT INTO "{table}" (phone_number, dataset_id, is_exported)
+        SELECT phone_number, ?, 0
+        FROM import_phones
+        WHERE in_db = 0 AND in_dataset = 0
+        ORDER BY first_seq
+    """, (dataset_id,))
+    new_count = cursor.rowcount
+
+    # Step 4: จำนวนครั้งที่ 2, 3, ... ของเบอร์เดียวกันลง Table 16 แถวละเบอร์ (80-100%)
+    # (ถ้าก้อนก่อนนำเข้าเบอร์นี้ไว้แล้ว ทุกครั้งในก้อนนี้นับเป็นครั้งที่ซ้ำ)
+    report(80, "กำลังนำเข้า Table 16 (ซ้ำ)...")
+    repeats = "SELECT phone_number, first_seq, occurrences - 1 + in_dataset AS repeats " \
+              "FROM import_phones WHERE in_db = 0 AND occurrences - 1 + in_dataset > 0"
+    cursor.execute(f"SELECT COALESCE(SUM(repeats), 0) FROM ({repeats})")
+    duplicate_count = cursor.fetchone()[0]
+    existing = ""
+    if continue_dataset:
+        # เบอร์ที่ก้อนก่อนลง Table 16 ไว้แล้ว บวกเพิ่มที่แถวเดิม (ค้นผ่าน index ของเบอร์)
+        cursor.execute(f"""
+            SELECT id, repeats FROM (
+                SELECT (SELECT MAX(d.id) FROM {DUPLICATE_TABLE} d
+                        WHERE d.phone_number = p.phone_number AND +d.dataset_id = ?) AS id,
+                       p.repeats
+                FROM ({repeats}) p
+            ) WHERE id IS NOT NULL
+        """, (dataset_id,))
+        cursor.executemany(
+            f"UPDATE {DUPLICATE_TABLE} SET occurrence_count = occurrence_count + ? WHERE id = ?",
+            [(count, row_id) for row_id, count in cursor.fetchall()])
+        existing = f"""
+            AND NOT EXISTS (
+                SELECT 1 FROM phone_registry r
+                WHERE r.phone_number = p.phone_number
+                  AND r.table_no = {PHONE_TABLES.index(DUPLICATE_TABLE) + 1} AND r.dataset_id = ?
+            )"""
+    cursor.execute(f"""
+        INSERT INTO {DUPLICATE_TABLE} (phone_number, dataset_id, is_exported, occurrence_count)
+        SELECT p.phone_number, ?, 0, p.repeats
+        FROM ({repeats}) p
+        WHERE 1 {existing}
+        ORDER BY p.first_seq
+    """, (dataset_id, dataset_id) if continue_dataset else (dataset_id,))
+
+    cursor.execute("DROP TABLE temp.import_phones")
+    return new_count, duplicate_count, db_duplicate_count
+
+
+def _load_known_duplicates(cursor, duplicates):
+    """พักเบอร์ที่รู้แล้วว่ามีอยู่ในฐานข้อมูลไว้ใน temp.import_known ให้ _import_phone_batch ใช้"""
+    cursor.execute("DROP TABLE IF EXISTS temp.import_known")
+    cursor.execute("CREATE TEMP TABLE import_known (phone_number TEXT PRIMARY KEY)")
+    cursor.executemany("INSERT INTO import_known (phone_number) VALUES (?)",
+                       ((phone,) for phone in duplicates))
+
+
+def _drop_import_temp_tables(conn):
+    for name in ("import_phones", "import_known"):
+        conn.execute(f"DROP TABLE IF EXISTS temp.{name}")
+
+
+def import_phone_numbers(conn, table, phone_numbers, dataset, progress=None,
+                         check_all_tables=False, known_duplicates=None):
+    """บันทึกเบอร์ทั้งหมดใน phone_numbers ลง table ใน transaction เดียว
+
+    การแยกเบอร์ลง table / Table 16 / ข้ามเบอร์ที่มีอยู่แล้ว เป็นไปตาม _import_phone_batch
+    dataset คือ (dataset_name, receive_date, source, detail, data_type, created_at)
+    ซึ่งจะถูกบันทึกเป็น 1 แถวใน datasets และทุกแถวเบอร์อ้างถึงด้วย dataset_id
+    known_duplicates คือ (duplicates, version) ที่ได้จาก find_db_duplicates ด้วย table และ
+    check_all_tables เดียวกัน ถ้าฐานข้อมูลยังไม่ถูกแก้ไขตั้งแต่ตอนนั้นจะใช้ผลเดิมแทนการตรวจใหม่
+    คืนค่า (new_count, duplicate_count, db_duplicate_count)
+    """
+    report = progress or (lambda percent, text="": None)
+    try:
+        # ทั้งการนำเข้าเป็น transaction เดียว ถ้าล้มกลางทางจะไม่มีเบอร์ลงไปครึ่งๆ กลางๆ
+        with bulk_transaction(conn) as cursor:
+            # เทียบ version หลังได้ lock เขียนแล้ว จึงไม่มีใครแก้ข้อมูลแทรกได้อีก
+            reuse_duplicates = (known_duplicates is not None
+                                and known_duplicates[1] == data_version_token(conn))
+            if reuse_duplicates:
+                _load_known_duplicates(cursor, known_duplicates[0])
+            dataset_id = create_dataset(cursor, dataset)
+            new_count, duplicate_count, db_duplicate_count = _import_phone_batch(
+                cursor, table, phone_numbers, dataset_id, check_all_tables,
+                use_known_duplicates=reuse_duplicates, progress=report)
+
+            if new_count == 0 and duplicate_count == 0:
+                # ไม่มีเบอร์ใหม่เลย ไม่ต้องเก็บชุดข้อมูลว่างไว้
+                cursor.execute("DELETE FROM datasets WHERE dataset_id = ?", (dataset_id,))
+
+        report(100, "เสร็จสิ้น")
+        return new_count, duplicate_count, db_duplicate_count
+    finally:
+        _drop_import_temp_tables(conn)
+
+
+def import_phone_files(conn, file_paths, table, dataset, progress=None,
+                       check_all_tables=False, known_duplicates=None):
+    """นำเข้าเบอร์จากไฟล์เป็นงานนำเข้า (import job) ที่ทำต่อได้ถ้าล้มหรือถูกยกเลิกกลางทาง
+
+    สร้างงานด้วย create_import_job แล้วนำเข้าทีละ checkpoint ด้วย run_import_job
+    ผลลัพธ์เหมือน import_phone_numbers ส่วน known_duplicates คือ (duplicates, version, sources)
+    โดย sources คือผลของ stat_source_files ตอนอ่านไฟล์ที่ใช้ตรวจเบอร์ซ้ำ
+    คืนค่า (new_count, duplicate_count, db_duplicate_count)
+    """
+    job_id, known_duplicates = create_import_job(conn, file_paths, table, dataset,
+                                                 check_all_tables, known_duplicates)
+    return run_import_job(conn, job_id, progress, known_duplicates)
+
+
+def stat_source_files(file_paths):
+    """คืนค่า [[path, size, mtime_ns], ...] ของไฟล์ ใช้ตรวจว่าไฟล์ยังไม่ถูกแก้ไข"""
+    sources = []
+    for path in file_paths:
+        stat = os.stat(path)
+        sources.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return sources
+
+
+def check_source_files(file_paths):
+    """เปิดไฟล์บีบอัดแต่ละไฟล์แล้วคลายก้อนแรกของทุก stream ให้ไฟล์ที่เสียตั้งแต่ต้น
+    (เช่น .zip ที่ไม่ใช่ zip หรือ header ของ .xz/.gz เสีย) โยน error ก่อนเริ่มนำเข้า
+
+    ไฟล์ที่เสียตรงกลางหรือไม่ครบจะพบตอนอ่านถึงจุดนั้น (ดู run_import_job)
+    """
+    for path in file_paths:
+        if is_compressed_file(path):
+            with open(path, "rb") as raw:
+                for stream in _open_decompressed_streams(path, raw):
+                    stream.read(DECOMPRESS_READ_SIZE)
+
+
+def create_import_job(conn, file_paths, table, dataset, check_all_tables=False,
+                      known_duplicates=None):
+    """สร้างชุดข้อมูลและแถวใน import_jobs ของไฟล์ file_paths (ยังไม่นำเข้าเบอร์)
+
+    คืนค่า (job_id, known_duplicates) โดย known_duplicates เป็น (duplicates, version) ที่ยังใช้กับ
+    run_import_job ได้ (None ถ้าฐานข้อมูลถูกแก้ไข หรือไฟล์ไม่ใช่ชุดเดียวกับที่ตรวจไว้)
+    """
+    sources = stat_source_files(file_paths)
+    # ไฟล์บีบอัดที่เปิดไม่ได้ตั้งแต่ต้นไม่ต้องสร้างงานที่นำเข้าต่อไม่ได้ทิ้งไว้
+    check_source_files(file_paths)
+
+    with bulk_transaction(conn) as cursor:
+        # ผลตรวจเบอร์ซ้ำมาจากเนื้อหาไฟล์ตอนโหลด ถ้าไฟล์ถูกแก้หลังจากนั้นต้องตรวจใหม่
+        valid_known = (known_duplicates is not None
+                       and known_duplicates[2] == sources
+                       and known_duplicates[1] == data_version_token(conn))
+        dataset_id = create_dataset(cursor, dataset)
+        cursor.execute("""
+            INSERT INTO import_jobs (source_files, table_name, check_all_tables, dataset_id,
+                                     bytes_total)
+            VALUES (?, ?, ?, ?, ?)
+        """, (json.dumps(sources), table, int(check_all_tables), dataset_id,
+              sum(size for _, size, _ in sources)))
+        job_id = cursor.lastrowid
+        # แถวที่เพิ่งเพิ่มเป็นของงานนี้เอง ผลตรวจเบอร์ซ้ำจึงยังใช้ได้ต่อด้วย version ใหม่
+        if valid_known:
+            known_duplicates = (known_duplicates[0], data_version_token(conn))
+    return job_id, known_duplicates if valid_known else None
+
+
+def run_import_job(conn, job_id, progress=None, known_duplicates=None):
+    """นำเข้างาน job_id ต่อจาก checkpoint ล่าสุดจนเสร็จ
+
+    อ่านไฟล์ต่อจาก byte_offset ที่บันทึกไว้ทีละ IMPORT_CHECKPOINT_BYTES แต่ละก้อนนำเข้า
+    พร้อมบันทึก byte_offset/จำนวนแถวใหม่ใน transaction เดียวกัน ถ้าโปรแกรมล่มหรือถูกยกเลิก
+    ก้อนที่ยังไม่ commit จะหายไปทั้งก้อน จึงทำต่อได้โดยไม่มีเบอร์ถูกนำเข้าซ้ำ
+    ไฟล์ต้นทางต้องมีขนาดและเวลาแก้ไขเหมือนตอนเริ่มงาน
+    คืนค่า (new_count, duplicate_count, db_duplicate_count) รวมทั้งงาน
+    """
+    report = progress or (lambda percent, text="": None)
+    job = conn.execute("""
+        SELECT source_files, table_name, check_all_tables, dataset_id, byte_offset,
+               bytes_total, batch_count, status
+        FROM import_jobs WHERE job_id = ?
+    """, (job_id,)).fetchone()
+    if job is None:
+        raise ValueError(f"ไม่พบงานนำเข้า #{job_id}")
+    (source_files, table, check_all_tables, dataset_id, byte_offset,
+     bytes_total, batch_count, status) = job
+    if status == "failed":
+        raise ValueError(f"งานนำเข้า #{job_id} อ่านไฟล์ไม่สำเร็จ นำเข้าต่อไม่ได้ "
+                         f"(ลบเบอร์ที่นำเข้าไปแล้วด้วยการยกเลิกงาน)")
+
+    if status == "running":
+        sources = json.loads(source_files)
+        for path, size, mtime_ns in sources:
+            stat = os.stat(path)
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                raise ValueError(f"ไฟล์ {path} ถูกแก้ไขหลังเริ่มนำเข้า ไม่สามารถนำเข้าต่อได้")
+
+        known_loaded = False
+        batches = _iter_phone_batches([path for path, _, _ in sources],
+                                      IMPORT_CHECKPOINT_BYTES, byte_offset)
+        try:
+            for numbers, rejected, bytes_done in batches:
+                with bulk_transaction(conn) as cursor:
+                    reuse_duplicates = (known_duplicates is not None
+                                        and known_duplicates[1] == data_version_token(conn))
+                    if reuse_duplicates and not known_loaded:
+                        _load_known_duplicates(cursor, known_duplicates[0])
+                        known_loaded = True
+                    new_count, duplicate_count, db_duplicate_count = _import_phone_batch(
+                        cursor, table, numbers, dataset_id, bool(check_all_tables),
+                        use_known_duplicates=reuse_duplicates,
+                        continue_dataset=batch_count > 0)
+                    cursor.execute("""
+                        UPDATE import_jobs
+                        SET byte_offset = ?, batch_count = batch_count + 1,
+                            phone_count = phone_count + ?, rejected_count = rejected_count + ?,
+                            new_count = new_count + ?, duplicate_count = duplicate_count + ?,
+                            db_duplicate_count = db_duplicate_count + ?,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE job_id = ?
+                    """, (bytes_done, len(numbers), rejected, new_count, duplicate_count,
+                          db_duplicate_count, job_id))
+                    # version หลังการเขียนของงานนี้เอง ใช้ตรวจก้อนถัดไป
+                    if reuse_duplicates:
+                        known_duplicates = (known_duplicates[0], data_version_token(conn))
+                    else:
+                        known_duplicates = None
+                batch_count += 1
+                report(bytes_done / bytes_total * 100,
+                       f"นำเข้าแล้ว {bytes_done / 1048576:,.1f} / "
+                       f"{bytes_total / 1048576:,.1f} MB")
+        except DECOMPRESS_ERRORS as e:
+            # ไฟล์เสียที่ตำแหน่งเดิมทุกครั้ง ทำต่อไม่ได้ จึงปิดงานเป็น failed ให้ยกเลิกได้
+            with bulk_transaction(conn) as cursor:
+                cursor.execute("""
+                    UPDATE import_jobs SET status = 'failed', updated_at = CURRENT_TIMESTAMP
+                    WHERE job_id = ?
+                """, (job_id,))
+            raise ValueError(f"ไฟล์บีบอัดเสียหายหรือไม่ครบ ({e}) งานนำเข้า #{job_id} "
+                             f"นำเข้าต่อไม่ได้ ลบเบอร์ที่นำเข้าไปแล้วด้วยการยกเลิกงาน") from e
+        finally:
+            batches.close()
+            _drop_import_temp_tables(conn)
+
+        with bulk_transaction(conn) as cursor:
+            cursor.execute("""
+                UPDATE import_jobs SET status = 'done', updated_at = CURRENT_TIMESTAMP
+                WHERE job_id = ?
+            """, (job_id,))
+            cursor.execute("""
+                DELETE FROM datasets
+                WHERE dataset_id = ?
+                  AND (SELECT new_count + duplicate_count FROM import_jobs WHERE job_id = ?) = 0
+            """, (dataset_id, job_id))
+
+    report(100, "เสร็จสิ้น")
+    return conn.execute("""
+        SELECT new_count, duplicate_count, db_duplicate_count FROM import_jobs WHERE job_id = ?
+    """, (job_id,)).fetchone()
+
+
+def list_import_jobs(conn, unfinished_only=True):
+    """รายการงานนำเข้า (ล่าสุดก่อน) เป็น list ของ
+    (job_id, dataset_name, table_name, byte_offset, bytes_total, phone_count, rejected_count,
+    new_count, duplicate_count, db_duplicate_count, status, updated_at)
+    """
+    where = "WHERE j.status != 'done'" if unfinished_only else ""
+    return conn.execute(f"""
+        SELECT j.job_id, COALESCE(d.dataset_name, ''), j.table_name, j.byte_offset,
+               j.bytes_total, j.phone_count, j.rejected_count, j.new_count,
+               j.duplicate_count, j.db_duplicate_count, j.status, j.updated_at
+        FROM import_jobs j
+        LEFT JOIN datasets d ON d.dataset_id = j.dataset_id
+        {where}
+        ORDER BY j.job_id DESC
+    """).fetchall()
+
+
+def discard_import_job(conn, job_id):
+    """ยกเลิกงานนำเข้าที่ค้างอยู่: ลบเบอร์ที่นำเข้าไปแล้ว ชุดข้อมูล และตัวงาน
+
+    คืนค่าจำนวนแถวเบอร์ที่ถูกลบ
+    """
+    with bulk_transaction(conn) as cursor:
+        row = cursor.execute("SELECT dataset_id, status FROM import_jobs WHERE job_id = ?",
+                             (job_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"ไม่พบงานนำเข้า #{job_id}")
+        dataset_id, status = row
+        if status == "done":
+            raise ValueError(f"งานนำเข้า #{job_id} เสร็จไปแล้ว")
+        deleted = 0
+        for table in PHONE_TABLES:
+            cursor.execute(f"DELETE FROM {table} WHERE dataset_id = ?", (dataset_id,))
+            deleted += cursor.rowcount
+        cursor.execute("DELETE FROM datasets WHERE dataset_id = ?", (dataset_id,))
+        cursor.execute("DELETE FROM import_jobs WHERE job_id = ?", (job_id,))
+    return deleted
+
+
+class _ExternalSorter:
+    """เรียงตัวเลข 64 บิต (ไม่ติดลบ) ที่มีมากเกินหน่วยความจำ ด้วยไฟล์ run บนดิสก์
+
+    เก็บค่าไว้ในหน่วยความจำไม่เกินราว memory ไบต์ (รวมค่า int ชั่วคราวตอน sorted)
+    เมื่อเต็มจะเรียงแล้วเขียนเป็นไฟล์ run ใน workdir ตอนอ่านผลจะรวมทุก run แบบ k-way merge
+    ทีละไม่เกิน EXTERNAL_MERGE_FAN_IN ไฟล์
+    """
+
+    def __init__(self, workdir, memory):
+        self.workdir = workdir
+        self.memory = memory
+        # array 8 ไบต์ + list 8 ไบต์ + int ชั่วคราว 32 ไบต์ต่อค่าตอน sorted และ array ผลลัพธ์
+        self.capacity = max(1024, memory // 64)
+        self.values = array('Q')
+        self.runs = []
+        self.count = 0
+
+    def append(self, value):
+        self.values.append(value)
+        if len(self.values) >= self.capacity:
+            self._spill()
+
+    def extend(self, values):
+        self.values.extend(values)
+        if len(self.values) >= self.capacity:
+            self._spill()
+
+    def _new_run_path(self):
+        fd, path = tempfile.mkstemp(suffix=".run", dir=self.workdir)
+        os.close(fd)
+        return path
+
+    def _spill(self):
+        values, self.values = self.values, array('Q')
+        for start in range(0, len(values), self.capacity):
+            run = array('Q', sorted(values[start:start + self.capacity]))
+            path = self._new_run_path()
+            with open(path, 'wb') as f:
+                run.tofile(f)
+            self.runs.append(path)
+            self.count += len(run)
+
+    @staticmethod
+    def _read_run(path, block_items):
+        with open(path, 'rb') as f:
+            while True:
+                block = array('Q')
+                try:
+                    block.fromfile(f, block_items)
+                except EOFError:
+                    # fromfile เติมค่าที่เหลือให้ก่อนแจ้ง EOFError
+                    yield from block
+                    return
+                yield from block
+
+    def __len__(self):
+        return self.count + len(self.values)
+
+    def __iter__(self):
+        """คืนค่าทั้งหมดเรียงจากน้อยไปมาก (เรียกครั้งเดียวหลังใส่ค่าครบแล้ว)"""
+        if not self.runs:
+            yield from sorted(self.values)
+            return
+        self._spill()
+        runs = self.runs
+        # รวมทีละกลุ่มจนเหลือไม่เกิน fan-in ไฟล์ จำกัดจำนวนไฟล์ที่เปิดและ buffer ต่อไฟล์
+        while len(runs) > EXTERNAL_MERGE_FAN_IN:
+            block_items = max(1024, self.memory // (16 * EXTERNAL_MERGE_FAN_IN))
+            merged_runs = []
+            for i in range(0, len(runs), EXTERNAL_MERGE_FAN_IN):
+                group = runs[i:i + EXTERNAL_MERGE_FAN_IN]
+                path = self._new_run_path()
+                with open(path, 'wb') as f:
+                    buffer = array('Q')
+                    for value in heapq.merge(*(self._read_run(run, block_items)
+                                               for run in group)):
+                        buffer.append(value)
+                        if len(buffer) >= block_items:
+                            buffer.tofile(f)
+                            buffer = array('Q')
+                    buffer.tofile(f)
+                for run in group:
+                    os.remove(run)
+                merged_runs.append(path)
+            runs = merged_runs
+        self.runs = runs
+        block_items = max(1024, self.memory // (16 * len(runs)))
+        yield from heapq.merge(*(self._read_run(run, block_items) for run in runs))
+
+
+def _iter_db_phone_values(conn, table, check_all_tables):
+    """เบอร์ที่มีอยู่แล้วใน table (หรือทุก Table) เป็นตัวเลขเรียงจากน้อยไปมาก
+
+    อ่านตามลำดับของ index เบอร์ (หรือ primary key ของทะเบียนเบอร์) ไม่ต้องเรียงใหม่
+    เบอร์แบบ TEXT มี 10 หลักเท่ากัน ลำดับตัวอักษรจึงตรงกับลำดับตัวเลข
+    """
+    source = "phone_registry" if check_all_tables else f'"{table}"'
+    for (phone,) in conn.execute(
+            f"SELECT DISTINCT phone_number FROM {source} ORDER BY phone_number"):
+        if isinstance(phone, int):
+            yield phone
+        elif isinstance(phone, str) and len(phone) == 10 and phone.isdigit():
+            yield int(phone)
+
+
+def import_phone_files_external(conn, file_paths, table, dataset, progress=None,
+                                check_all_tables=False, memory=EXTERNAL_SORT_MEMORY,
+                                workdir=None):
+    """นำเข้าเบอร์จากไฟล์ที่ใหญ่เกินหน่วยความจำ โดยหาเบอร์ซ้ำด้วยการเรียงบนดิสก์ (sort-merge)
+
+    1) อ่านไฟล์ทีละก้อน เก็บ (เบอร์, ลำดับบรรทัด) เป็นไฟล์ run ที่เรียงแล้วใน workdir
+    2) รวม run ตามลำดับเบอร์ คู่กับการอ่าน index เบอร์ของฐานข้อมูลตามลำดับ (merge join)
+       เบอร์ที่มีอยู่แล้วถูกข้าม ส่วนเบอร์ใหม่เก็บลำดับบรรทัดแรกไว้เรียงอีกรอบ
+    3) เพิ่มเบอร์ใหม่ลง table ตามลำดับที่พบครั้งแรกในไฟล์ และจำนวนครั้งที่ซ้ำลง Table 16
+       (เรียงตามเบอร์)
+    หน่วยความจำของการเรียงไม่เกินราว memory ไบต์ ไม่ว่าไฟล์จะใหญ่แค่ไหน ผลลัพธ์ตรงกับ
+    import_phone_numbers แต่ทั้งหมดอยู่ใน transaction เดียวและไม่ใช่งานนำเข้าที่ทำต่อได้
+    คืนค่า (new_count, duplicate_count, db_duplicate_count)
+    """
+    report = progress or (lambda percent, text="": None)
+    seq_mask = (1 << _EXTERNAL_SEQ_BITS) - 1
+    phone_mask = (1 << _EXTERNAL_PHONE_BITS) - 1
+    # แบ่งหน่วยความจำให้รอบที่ 1 ทั้งหมด ส่วนรอบที่ 2 ใช้อ่าน run ครึ่งหนึ่งและเก็บเบอร์ใหม่ครึ่งหนึ่ง
+    with tempfile.TemporaryDirectory(dir=workdir) as temp_dir:
+        # รอบที่ 1: key = เบอร์ << 34 | ลำดับบรรทัด เรียงแล้วได้ลำดับตามเบอร์ และบรรทัดแรกก่อน
+        occurrences = _ExternalSorter(temp_dir, memory)
+        seq = 0
+        for chunk, bytes_done, bytes_total in iter_file_chunks(file_paths):
+            numbers, _ = normalize_phone_batch(chunk)
+            occurrences.extend((int(phone) << _EXTERNAL_SEQ_BITS) | s
+                               for s, phone in enumerate(numbers, seq))
+            seq += len(numbers)
+            report(bytes_done / bytes_total * 40 if bytes_total else 40,
+                   f"กำลังเรียงเบอร์ {bytes_done / 1048576:,.1f} / "
+                   f"{bytes_total / 1048576:,.1f} MB")
+
+        total = len(occurrences)
+        new_numbers = _ExternalSorter(temp_dir, memory // 2)
+        occurrences.memory = memory // 2
+        repeats_path = os.path.join(temp_dir, "repeats.bin")
+        duplicate_count = 0
+        db_duplicate_count = 0
+        with bulk_transaction(conn) as cursor:
+            # รอบที่ 2: รวม run + merge join กับ index ของฐานข้อมูล (40-70%)
+            report(40, "กำลังตรวจสอบเบอร์ซ้ำกับฐานข้อมูล...")
+            db_phones = _iter_db_phone_values(conn, table, check_all_tables)
+            next_db = next(db_phones, None)
+            with open(repeats_path, 'wb') as repeats_file:
+                repeats = array('Q')
+
+                def finish(phone, first_seq, count):
+                    nonlocal next_db, duplicate_count, db_duplicate_count, repeats
+                    while next_db is not None and next_db < phone:
+                        next_db = next(db_phones, None)
+                    if next_db == phone:
+                        db_duplicate_count += count
+                        return
+                    new_numbers.append((first_seq << _EXTERNAL_PHONE_BITS) | phone)
+                    if count > 1:
+                        duplicate_count += count - 1
+                        repeats.append((phone << _EXTERNAL_SEQ_BITS) | (count - 1))
+                        if len(repeats) >= 65536:
+                            repeats.tofile(repeats_file)
+                            repeats = array('Q')
+
+                current = None
+                first_seq = count = 0
+                for index, key in enumerate(occurrences, 1):
+                    phone = key >> _EXTERNAL_SEQ_BITS
+                    if phone != current:
+                        if current is not None:
+                            finish(current, first_seq, count)
+                        current, first_seq, count = phone, key & seq_mask, 0
+                    count += 1
+                    if index % 1_000_000 == 0:
+                        report(40 + index / total * 30,
+                               f"ตรวจสอบเบอร์ซ้ำ {index:,} / {total:,} เบอร์")
+                if current is not None:
+                    finish(current, first_seq, count)
+                repeats.tofile(repeats_file)
+            db_phones.close()
+
+            # รอบที่ 3: เบอร์ใหม่ตามลำดับในไฟล์ลง table และจำนวนที่ซ้ำลง Table 16 (70-100%)
+            report(70, "กำลังนำเข้า Table ปกติ...")
+            dataset_id = create_dataset(cursor, dataset)
+            cursor.executemany(
+                f'INSERT INTO "{table}" (phone_number, dataset_id, is_exported) VALUES (?, ?, 0)',
+                ((f"{key & phone_mask:010d}", dataset_id) for key in new_numbers))
+            new_count = len(new_numbers)
+
+            report(90, "กำลังนำเข้า Table 16 (ซ้ำ)...")
+            cursor.executemany(
+                f"INSERT INTO {DUPLICATE_TABLE} "
+                f"(phone_number, dataset_id, is_exported, occurrence_count) VALUES (?, ?, 0, ?)",
+                ((f"{key >> _EXTERNAL_SEQ_BITS:010d}", dataset_id, key & seq_mask)
+                 for key in _ExternalSorter._read_run(repeats_path, 65536)))
+            if new_count + duplicate_count == 0:
+                cursor.execute("DELETE FROM datasets WHERE dataset_id = ?", (dataset_id,))
+    report(100, "เสร็จสิ้น")
+    return new_count, duplicate_count, db_duplicate_count
+
+
+def move_datasets(conn, source_table, dest_table, dataset_names, delete_source=False,
+                  progress=None):
+    """ย้าย (หรือคัดลอก ถ้า delete_source เป็น False) ชุดข้อมูลจาก source_table ไป dest_table
+
+    ทุกชุดข้อมูลอยู่ใน transaction เดียว ถ้าล้มกลางทางจะไม่มีชุดไหนย้ายไปครึ่งเดียว
+    progress แจ้งตามจำนวนเบอร์ที่ย้ายแล้วเทียบกับจำนวนเบอร์ของทุกชุดที่เลือก
+    คืนค่าจำนวนเบอร์ที่ย้าย
+    """
+    report = progress or (lambda percent, text="": None)
+    total_moved = 0
+    with bulk_transaction(conn) as cursor:
+        report(None, "กำลังนับเบอร์ของชุดข้อมูลที่เลือก...")
+        total_rows = sum(cursor.execute(
+            f"SELECT COUNT(*) FROM {source_table} WHERE {dataset_ids_sql()}", (dataset,)
+        ).fetchone()[0] for dataset in dataset_names)
+        for dataset in dataset_names:
+            cursor.execute(f"""
+                INSERT INTO {dest_table}
+                (phone_number, dataset_id, is_exported)
+                SELECT phone_number, dataset_id, is_exported
+                FROM {source_table} WHERE {dataset_ids_sql()}
+                ORDER BY id
+            """, (dataset,))
+            total_moved += cursor.rowcount
+
+            # ลบต้นทางเฉพาะเมื่อเลือกให้ลบ
+            if delete_source:
+                cursor.execute(
+                    f"DELETE FROM {source_table} WHERE {dataset_ids_sql()}", (dataset,))
+
+            report(total_moved / total_rows * 100 if total_rows else 100,
+                   f"ย้าย {dataset} แล้ว ({total_moved:,} / {total_rows:,} เบอร์)")
+    return total_moved
+
+
+def list_table_datasets(conn, table):
+    """ชื่อชุดข้อมูลที่มีเบอร์อยู่ใน table เรียงตามชื่อ"""
+    return [row[0] for row in conn.execute(f"""
+        SELECT DISTINCT d.dataset_name FROM datasets d
+        WHERE EXISTS (SELECT 1 FROM {table} t WHERE t.dataset_id = d.dataset_id)
+        ORDER BY d.dataset_name
+    """)]
+
+
+def count_export_datasets(conn, table):
+    """จำนวนเบอร์ของแต่ละชุดข้อมูลใน table คืนค่า list ของ (dataset_name, ทั้งหมด, ยังไม่เคยส่งออก)"""
+    return conn.execute(f"""
+        SELECT d.dataset_name, SUM(c.total), SUM(c.exportable)
+        FROM (
+            SELECT dataset_id,
+                COUNT(*) AS total,
+                SUM(CASE WHEN is_exported = 0 THEN 1 ELSE 0 END) AS exportable
+            FROM {table}
+            GROUP BY dataset_id
+        ) c
+        JOIN datasets d ON d.dataset_id = c.dataset_id
+        GROUP BY d.dataset_name
+    """).fetchall()
+
+
+def export_phone_numbers(conn, table, selections, progress=None):
+    """ดึงเบอร์ตามจำนวนที่ต้องการของแต่ละชุดข้อมูล แล้วตั้ง is_exported = 1
+
+    selections คือ list ของ (dataset_name, limit) เบอร์ที่ยังไม่เคยส่งออกจะถูกเลือกก่อน
+    ถ้าขอเกินจำนวนที่เหลือจะได้เบอร์ที่เคยส่งออกไปแล้วด้วย คืนค่า list ของเบอร์ตามลำดับ
+    """
+    report = progress or (lambda percent, text="": None)
+    requested = sum(limit for _, limit in selections)
+    all_numbers = []
+    # อัปเดต is_exported ของทุกชุดข้อมูลแล้ว commit ครั้งเดียว
+    with bulk_transaction(conn) as cursor:
+        for dataset_name, limit in selections:
+            cursor.execute(f"""
+                SELECT id, {phone_sql()} FROM {table}
+                WHERE {dataset_ids_sql()}
+                ORDER BY is_exported ASC, id ASC
+                LIMIT ?
+            """, (dataset_name, limit))
+            results = cursor.fetchall()
+            all_numbers.extend(row[1] for row in results)
+
+            # อัปเดต is_exported = 1 (executemany แทน IN (...) ยาวๆ
+            # ซึ่งเกินจำนวนพารามิเตอร์สูงสุดของ SQLite ได้เมื่อส่งออกเยอะ)
+            cursor.executemany(
+                f"UPDATE {table} SET is_exported = 1 WHERE id = ?",
+                ((row[0],) for row in results))
+            report(len(all_numbers) / requested * 100 if requested else 100,
+                   f"ส่งออกแล้ว {len(all_numbers):,} / {requested:,} เบอร์")
+    return all_numbers
+
+
+def find_duplicate_numbers(conn, progress=None):
+    """สรุปเบอร์ใน Table 16 คืนค่า (จำนวนเบอร์ไม่ซ้ำทั้งหมด, [(เบอร์, จำนวนครั้ง)] ที่ซ้ำ > 1)
+
+    จำนวนครั้งคือผลรวม occurrence_count ของเบอร์นั้นจากทุกชุดข้อมูล เรียงจากซ้ำมากไปน้อย
+    แถวถูกอ่านตามลำดับ index ของเบอร์ทีละก้อนระหว่างที่ SQLite ยังสแกนอยู่ แล้วเรียงใน Python
+    progress จึงแจ้งจำนวนเบอร์ที่ตรวจแล้วได้จริง
+    """
+    report = progress or (lambda percent, text="": None)
+    cursor = conn.cursor()
+    report(None, "กำลังนับเบอร์ใน Table 16...")
+    cursor.execute(f"SELECT COUNT(DISTINCT phone_number) FROM {DUPLICATE_TABLE}")
+    total_phones = cursor.fetchone()[0]
+    cursor.execute(f"""
+        SELECT {phone_sql()}, SUM(occurrence_count) as count
+        FROM {DUPLICATE_TABLE}
+        GROUP BY phone_number
+        HAVING count > 1
+        ORDER BY phone_number
+    """)
+    duplicates = []
+    while True:
+        rows = cursor.fetchmany(10000)
+        if not rows:
+            break
+        duplicates.extend(rows)
+        report(None, f"พบเบอร์ซ้ำแล้ว {len(duplicates):,} เบอร์ (จาก {total_phones:,} เบอร์)")
+    duplicates.sort(key=lambda row: (-row[1], row[0]))
+    return total_phones, duplicates
+
+
+def delete_duplicate_numbers(conn, phones, progress=None):
+    """ลบทุกแถวของเบอร์ใน phones ออกจาก Table 16 คืนค่าจำนวนแถวที่ลบ"""
+    report = progress or (lambda percent, text="": None)
+    total_deleted = 0
+    with bulk_transaction(conn) as cursor:
+        for index, phone in enumerate(phones, start=1):
+            cursor.execute(
+                f"DELETE FROM {DUPLICATE_TABLE} WHERE phone_number = ?", (phone,))
+            total_deleted += cursor.rowcount
+            if index % 1000 == 0 or index == len(phones):
+                report(index / len(phones) * 100, f"ลบแล้ว {index:,} / {len(phones):,} เบอร์")
+        delete_unused_datasets(cursor)
+    return total_deleted
+
+
+# ฟิลเตอร์เบอร์ของแท็บจัดการข้อมูล: "contains" หาเลขที่อยู่ตรงไหนของเบอร์ก็ได้, "prefix" หาเบอร์ที่ขึ้นต้นด้วยเลขนี้
+PHONE_MATCH_MODES = ("contains", "prefix")
+# FTS5 trigram ค้นได้เมื่อคำค้นยาวตั้งแต่ 3 ตัวอักษร สั้นกว่านี้ใช้ LIKE
+_TRIGRAM_MIN_CHARS = 3
+
+
+def _fts_phrase(text):
+    """คำค้นของ FTS5 ที่หา text ทั้งก้อน (ครอบด้วย "..." ให้อักขระพิเศษไม่ถูกตีความ)"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def manage_filter_sql(conn, table, phone="", dataset="", date_from="", date_to="",
+                      phone_match="contains"):
+    """เงื่อนไขของแท็บจัดการข้อมูลสำหรับ Table เบอร์ที่ใช้ alias t คืนค่า (sql, params)
+
+    sql ขึ้นต้นด้วย AND ต่อท้าย WHERE ได้ทันที เงื่อนไขของชุดข้อมูลเป็น subquery
+    ของ datasets จึงใช้นับแถวได้โดยไม่ต้อง join แต่ละฟิลเตอร์ใช้ index แทนการสแกน:
+    - เบอร์ครบ 10 หลัก หรือ phone_match="prefix": ช่วงค่าบน index ของ phone_number
+    - เลขบางส่วนตั้งแต่ 3 หลัก: FTS5 trigram ของ table (ถ้าฐานข้อมูลมี ดู has_search_index)
+    - ชื่อชุดข้อมูล: FTS5 trigram ของ datasets, วันที่: index ของ receive_date
+    """
+    if phone_match not in PHONE_MATCH_MODES:
+        raise ValueError(f"ไม่รู้จักวิธีค้นเบอร์: {phone_match}")
+    fts = (len(phone) >= _TRIGRAM_MIN_CHARS or len(dataset) >= _TRIGRAM_MIN_CHARS) \
+        and has_search_index(conn)
+    sql = ""
+    params = []
+    if phone and phone.isdigit() and len(phone) <= 10 and (
+            phone_match == "prefix" or len(phone) == 10):
+        # ช่วง '081' ถึง '081' + 9... เทียบได้ทั้งโหมด TEXT และ INTEGER (affinity แปลงค่าให้)
+        sql += " AND t.phone_number BETWEEN ? AND ?"
+        params += [phone.ljust(10, "0"), phone.ljust(10, "9")]
+    elif phone and phone_match == "prefix":
+        sql += f" AND {phone_sql('t.phone_number')} LIKE ?"
+        params.append(f"{phone}%")
+    elif len(phone) >= _TRIGRAM_MIN_CHARS and fts:
+        search = search_table(table)
+        sql += f" AND t.id IN (SELECT rowid FROM {search} WHERE {search} MATCH ?)"
+        params.append(_fts_phrase(phone))
+    elif phone:
+        sql += f" AND {phone_sql('t.phone_number')} LIKE ?"
+        params.append(f"%{phone}%")
+    dataset_conditions = []
+    if len(dataset) >= _TRIGRAM_MIN_CHARS and fts:
+        dataset_conditions.append(
+            "dataset_id IN (SELECT rowid FROM datasets_search WHERE datasets_search MATCH ?)")
+        params.append(_fts_phrase(dataset))
+    elif dataset:
+        dataset_conditions.append("dataset_name LIKE ?")
+        params.append(f"%{dataset}%")
+    if date_from:
+        dataset_conditions.append("receive_date >= ?")
+        params.append(date_from)
+    if date_to:
+        dataset_conditions.append("receive_date <= ?")
+        params.append(date_to)
+    if dataset_conditions:
+        sql += (" AND t.dataset_id IN (SELECT dataset_id FROM datasets WHERE "
+                + " AND ".join(dataset_conditions) + ")")
+    return sql, params
+
+
+def fetch_manage_page(conn, table, filters, after_id=None, before_id=None,
+                      limit=MANAGE_PAGE_ROWS):
+    """ดึงแถวของแท็บจัดการข้อมูล 1 หน้าแบบ keyset บน id แทน OFFSET ที่ต้องข้ามแถวก่อนหน้าทุกครั้ง
+
+    filters คือ keyword ของ manage_filter_sql ถ้าให้ after_id จะได้หน้าถัดไป (id > after_id)
+    ถ้าให้ before_id จะได้หน้าก่อนหน้า (id < before_id) คืนค่า list ของแถวเรียงตาม id เสมอ
+    """
+    where, params = manage_filter_sql(conn, table, **filters)
+    order = "ASC"
+    if after_id is not None:
+        where += " AND t.id > ?"
+        params.append(after_id)
+    if before_id is not None:
+        where += " AND t.id < ?"
+        params.append(before_id)
+        order = "DESC"
+    rows = conn.execute(f"""
+        SELECT t.id, {phone_sql('t.phone_number')}, d.dataset_name, d.receive_date,
+               d.source, d.data_type, d.created_at
+        FROM {table} t JOIN datasets d ON d.dataset_id = t.dataset_id
+        WHERE 1 {where}
+        ORDER BY t.id {order}
+        LIMIT ?
+    """, params + [limit]).fetchall()
+    return rows[::-1] if order == "DESC" else rows
+
+
+def manage_row_stats(conn, table, filters):
+    """สถิติของแท็บจัดการข้อมูลตามเงื่อนไขเดียวกับ fetch_manage_page คืนค่า (จำนวนแถว, จำนวนเบอร์ซ้ำ)
+
+    จำนวนเบอร์ซ้ำคือจำนวนเบอร์ที่มีมากกว่า 1 แถว นับด้วย GROUP BY บน index ของ phone_number
+    ใน SQL คำสั่งเดียว แถวจึงไม่ต้องถูกดึงมาที่ Python (แยกจากการดึงแถวทีละหน้า)
+    """
+    where, params = manage_filter_sql(conn, table, **filters)
+    total, duplicates = conn.execute(f"""
+        SELECT COALESCE(SUM(n), 0), COALESCE(SUM(n > 1), 0) FROM (
+            SELECT COUNT(*) AS n FROM {table} t
+            WHERE 1 {where}
+            GROUP BY t.phone_number
+        )
+    """, params).fetchone()
+    return total, duplicates
+
+
+def _iter_mmap_chunks(mm, start, end, chunk_size=IMPORT_CHUNK_SIZE):
+    """ตัดช่วง [start, end) ของไฟล์ที่ mmap ไว้เป็นก้อนประมาณ chunk_size โดยตัดที่ท้ายบรรทัดเสมอ
+
+    คัดลอกข้อมูลจากไฟล์ครั้งเดียวต่อก้อน (ไม่ต้องต่อเศษท้ายก้อนเหมือนการ read)
+    ส่วนหน้าที่อ่านแล้ว OS คืนหน่วยความจำได้เอง จึงอ่านไฟล์ที่ใหญ่กว่า RAM ได้
+    คืนค่า (chunk, position) โดย position คือตำแหน่งท้ายก้อนในไฟล์
+    """
+    while start < end:
+        cut = min(start + chunk_size, end)
+        if cut < end:
+            # ไม่ตัดที่ \r ตัวสุดท้าย เพราะอาจเป็นครึ่งแรกของ \r\n
+            cut = max(mm.rfind(b"\n", start, cut), mm.rfind(b"\r", start, cut - 1)) + 1
+            if cut <= start:
+                # บรรทัดยาวกว่า chunk_size ขยายไปจนจบบรรทัด
+                window = min(start + chunk_size, end) - 1
+                ends = [i for i in (mm.find(b"\n", window, end), mm.find(b"\r", window, end))
+                        if i >= 0]
+                cut = min(ends) + 1 if ends else end
+                if cut < end and mm[cut - 1:cut] == b"\r" and mm[cut:cut + 1] == b"\n":
+                    cut += 1
+        yield mm[start:cut], cut
+        start = cut
+
+
+@contextmanager
+def open_mmap(path):
+    """เปิดไฟล์แบบ mmap อ่านอย่างเดียว (ไฟล์ว่างคืนค่า b"" เพราะ mmap ขนาด 0 ไม่ได้)"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            yield mm
+
+
+def is_compressed_file(path):
+    return path.lower().endswith(COMPRESSED_SUFFIXES)
+
+
+def _open_decompressed_streams(path, raw):
+    """เปิดไฟล์บีบอัด raw ตามนามสกุลของ path แล้วคืน stream ของข้อมูลที่คลายแล้วทีละ stream
+
+    .gz และ .xz มี stream เดียว ส่วน .zip คืนทุก member ที่เป็น .txt ตามลำดับในไฟล์
+    """
+    lower = path.lower()
+    if lower.endswith(".gz"):
+        with gzip.GzipFile(fileobj=raw) as stream:
+            yield stream
+    elif lower.endswith(".xz"):
+        with lzma.LZMAFile(raw) as stream:
+            yield stream
+    else:
+        with zipfile.ZipFile(raw) as archive:
+            members = sorted((info for info in archive.infolist()
+                              if not info.is_dir() and info.filename.lower().endswith(".txt")),
+                             key=lambda info: info.header_offset)
+            if not members:
+                raise ValueError(f"ไม่พบไฟล์ .txt ใน {path}")
+            for info in members:
+                with archive.open(info) as stream:
+                    yield stream
+
+
+def _iter_compressed_chunks(path, size, chunk_size=IMPORT_CHUNK_SIZE):
+    """คลายไฟล์ .gz/.xz/.zip ระหว่างอ่าน แล้วตัดเป็นก้อนประมาณ chunk_size ที่ท้ายบรรทัดเสมอ
+
+    ไม่เขียนไฟล์ที่คลายแล้วลงดิสก์ และใช้หน่วยความจำแค่ราว 1 ก้อน คืนค่า (chunk, position)
+    โดย position คือจำนวนไบต์ของไฟล์บีบอัดที่อ่านไปแล้ว ซึ่งเพิ่มขึ้นทุกก้อน และเท่ากับ size
+    ที่ก้อนสุดท้าย การอ่านซ้ำได้ก้อนและ position ชุดเดิมเสมอ จึงใช้เป็นจุดทำต่อของงานนำเข้าได้
+    """
+    read_size = min(chunk_size, DECOMPRESS_READ_SIZE)
+    position = 0
+    pending = []
+    pending_bytes = 0
+    with open(path, "rb") as raw:
+        for stream in _open_decompressed_streams(path, raw):
+            while True:
+                data = stream.read(read_size)
+                if not data:
+                    break
+                pending.append(data)
+                pending_bytes += len(data)
+                # ตัดก้อนเฉพาะเมื่ออ่านไฟล์บีบอัดเพิ่มแล้ว position จึงไม่ซ้ำกับก้อนก่อน
+                if pending_bytes >= chunk_size and position < raw.tell() < size:
+                    buffer = b"".join(pending)
+                    # ไม่ตัดที่ \r ตัวสุดท้าย เพราะอาจเป็นครึ่งแรกของ \r\n
+                    cut = max(buffer.rfind(b"\n"), buffer.rfind(b"\r", 0, len(buffer) - 1)) + 1
+                    if cut:
+                        position = raw.tell()
+                        yield buffer[:cut], position
+                        buffer = buffer[cut:]
+                    pending = [buffer]
+                    pending_bytes = len(buffer)
+            # ไม่ให้บรรทัดสุดท้ายของ member ต่อกับบรรทัดแรกของ member ถัดไป
+            if pending_bytes and not pending[-1].endswith((b"\n", b"\r")):
+                pending.append(b"\n")
+                pending_bytes += 1
+    yield b"".join(pending), size
+
+
+def _iter_source_chunks(path, start, end, chunk_size=IMPORT_CHUNK_SIZE):
+    """อ่านช่วง [start, end) ของไฟล์ทีละก้อนที่ตัดท้ายบรรทัด คืนค่า (chunk, position)
+
+    ไฟล์บีบอัดอ่านตั้งแต่ต้นไฟล์เสมอ ก้อนที่ position ไม่เกิน start ถือว่าอ่านไปแล้ว
+    ซึ่ง start ต้องเป็น position ของก้อนใดก้อนหนึ่งพอดี (หรือ 0)
+    """
+    if not is_compressed_file(path):
+        with open_mmap(path) as mm:
+            yield from _iter_mmap_chunks(mm, start, min(end, len(mm)), chunk_size)
+        return
+    previous = 0
+    for chunk, position in _iter_compressed_chunks(path, end, chunk_size):
+        if previous >= start:
+            yield chunk, position
+        elif position > start:
+            raise ValueError(f"ไม่พบตำแหน่ง {start:,} ในไฟล์ {path} จึงอ่านต่อไม่ได้")
+        previous = position
+
+
+def iter_file_chunks(file_paths, chunk_size=IMPORT_CHUNK_SIZE, start=0):
+    """อ่านไฟล์ทีละก้อนใหญ่แบบ binary ผ่าน mmap โดยตัดก้อนที่ท้ายบรรทัดเสมอ
+
+    คืนค่า (chunk, bytes_done, bytes_total) ทีละก้อน เพื่อให้คำนวณ progress
+    จากจำนวนไบต์ที่อ่านไปแล้วได้โดยไม่ต้องนับบรรทัดก่อน bytes_done นับรวมทุกไฟล์
+    และส่งกลับมาเป็น start เพื่ออ่านต่อจากก้อนนั้นได้ ไฟล์ .gz/.xz/.zip จะถูกคลาย
+    ระหว่างอ่าน โดยนับไบต์ตามขนาดไฟล์บีบอัด
+    """
+    sizes = [os.path.getsize(path) for path in file_paths]
+    bytes_total = sum(sizes)
+    bytes_done = 0
+    for path, size in zip(file_paths, sizes):
+        if bytes_done + size > start:
+            for chunk, position in _iter_source_chunks(
+                    path, max(0, start - bytes_done), size, chunk_size):
+                yield chunk, bytes_done + position, bytes_total
+        bytes_done += size
+
+
+def _iter_phone_batches(file_paths, chunk_size, start=0):
+    """อ่านไฟล์ทีละก้อนแล้วแปลงเบอร์ คืนค่า (PhoneArray, rejected, bytes_done) ทีละก้อน
+
+    เก็บเบอร์ของก้อนเป็น PhoneArray ทันที (4 ไบต์ต่อเบอร์) และทิ้งข้อมูลดิบกับ list ของ str
+    ก่อนส่งต่อ ระหว่างที่ SQLite นำเข้าก้อนนั้นจึงไม่มีของทั้งสองค้างอยู่ในหน่วยความจำ
+    """
+    for chunk, bytes_done, _ in iter_file_chunks(file_paths, chunk_size, start):
+        numbers, rejected = normalize_phone_batch(chunk)
+        phones = PhoneArray(numbers)
+        del chunk, numbers
+        yield phones, rejected, bytes_done
+
+
+def normalize_phone(phone):
+    # แปลงเลขไทย/เลขยูนิโค้ดเป็นเลขอารบิกก่อน ทุกทางนำเข้าจึงเก็บเบอร์เดียวกันเหมือนกัน
+    # (PhoneArray เก็บเป็นตัวเลขและคืนเป็นเลขอารบิกเสมอ)
+    phone = re.sub(r'[^\d+]', '', _ascii_digits(phone))
+    if phone.startswith('+66'):
+        phone = '0' + phone[3:]
+    elif phone.startswith('66'):
+        phone = '0' + phone[2:]
+    elif not phone.startswith('0'):
+        phone = '0' + phone[-9:]
+    return phone if re.match(r'^0\d{9}$', phone) else None
+
+
+# ไบต์ที่ normalize_phone เก็บไว้ (ตัวเลขกับ +) ที่เหลือลบทิ้งหมด ยกเว้นตัวขึ้นบรรทัด
+# ซึ่งแปลง \r เป็น \n เพื่อให้ ^/$ ของ pattern ใช้ได้กับทุกแบบ (\r\n จะกลายเป็นบรรทัดว่าง
+# ที่ไม่มีผลกับผลลัพธ์ เพราะนับจำนวนบรรทัดจากข้อมูลต้นฉบับ)
+_PHONE_KEEP_BYTES = b"0123456789+\r\n"
+_PHONE_DELETE_BYTES = bytes(b for b in range(256) if b not in _PHONE_KEEP_BYTES)
+_CR_TO_LF = bytes.maketrans(b"\r", b"\n")
+# กฎเดียวกับ normalize_phone ในรูปแบบ pattern เดียวที่ทำงานทีละบรรทัดของก้อนข้อมูล:
+# 0/+66/66 ตามด้วยเลข 9 หลักพอดี หรือขึ้นต้นอย่างอื่นแต่ 9 ตัวท้ายเป็นตัวเลข
+_PHONE_LINE_RE = re.compile(
+    rb"^(?:0|\+66|66|(?!\+66|66|0)[0-9+]*)([0-9]{9})$", re.MULTILINE)
+# เลขไทย/เลขยูนิโค้ด ถ้าเจอต้องใช้ normalize_phone ทีละบรรทัด (ซึ่งแปลงเป็นเลขอารบิกให้)
+_NON_ASCII_DIGIT_RE = re.compile(r"[^\D0-9]")
+
+
+def _ascii_digits(text):
+    """แปลงเลขฐานสิบที่ไม่ใช่ ASCII (เช่นเลขไทย ๐-๙) ใน text เป็นเลขอารบิก 0-9"""
+    if text.isascii():
+        return text
+    return _NON_ASCII_DIGIT_RE.sub(lambda m: str(unicodedata.decimal(m.group())), text)
+_ASCII_BYTES = bytes(range(128))
+
+
+def _normalize_phone_block(data):
+    """แปลงก้อน bytes ที่ไม่มีเลขยูนิโค้ด คืนค่า (numbers, rejected)"""
+    cleaned = data.translate(_CR_TO_LF, _PHONE_DELETE_BYTES)
+    groups = _PHONE_LINE_RE.findall(cleaned)
+    numbers = ("0" + b"\n0".join(groups).decode("ascii")).split("\n") if groups else []
+
+    line_count = data.count(b"\n") + data.count(b"\r") - data.count(b"\r\n")
+    if data and data[-1:] not in (b"\n", b"\r"):
+        line_count += 1
+    return numbers, line_count - len(numbers)
+
+
+def _normalize_phone_lines(lines):
+    numbers = []
+    for line in lines:
+        phone = normalize_phone(line)
+        if phone:
+            numbers.append(phone)
+    return numbers, len(lines) - len(numbers)
+
+
+def normalize_phone_batch(chunk):
+    """แปลงเบอร์ทั้งก้อนในครั้งเดียว ให้ผลเหมือนเรียก normalize_phone ทีละบรรทัด
+
+    chunk เป็น bytes (UTF-8) หรือ str ที่มีหลายบรรทัด หรือ list ของบรรทัดก็ได้
+    คืนค่า (numbers, rejected) โดย numbers คือเบอร์ 0XXXXXXXXX ตามลำดับบรรทัด
+    และ rejected คือจำนวนบรรทัดที่ไม่ใช่เบอร์ที่ถูกต้อง
+    """
+    if isinstance(chunk, (bytes, bytearray, memoryview)):
+        data = bytes(chunk) if isinstance(chunk, memoryview) else chunk
+        if data.isascii():
+            return _normalize_phone_block(data)
+        text = data.decode('utf-8')
+        # ตรวจเลขยูนิโค้ดเฉพาะส่วนที่ไม่ใช่ ASCII ซึ่งเร็วกว่าค้นทั้งข้อความมาก
+        if not _NON_ASCII_DIGIT_RE.search(data.translate(None, _ASCII_BYTES).decode('utf-8')):
+            return _normalize_phone_block(data)
+        return _normalize_phone_lines(split_lines(text))
+
+    if isinstance(chunk, str):
+        text = chunk
+        lines = None
+    else:
+        lines = list(chunk)
+        text = "\n".join(lines)
+        # บรรทัดที่มีตัวขึ้นบรรทัดติดมา (เช่นจาก readlines) ต้องตัดออกก่อนนำมาต่อกัน
+        if text.count("\n") != max(len(lines) - 1, 0) or "\r" in text:
+            lines = [line.replace("\r", "").replace("\n", "") for line in lines]
+            text = "\n".join(lines)
+
+    if _NON_ASCII_DIGIT_RE.search(text):
+        return _normalize_phone_lines(split_lines(text) if lines is None else lines)
+    numbers, rejected = _normalize_phone_block(text.encode('utf-8'))
+    if lines is not None:
+        rejected = len(lines) - len(numbers)
+    return numbers, rejected
+
+
+def benchmark_normalize(line_count=10_000_000, seed=42):
+    """วัดความเร็ว normalize_phone ทีละบรรทัดเทียบกับ normalize_phone_batch
+
+    สร้างไฟล์จำลองในหน่วยความจำที่มีรูปแบบเบอร์ปนกัน (0/66/+66, มีขีด/ช่องว่าง,
+    บรรทัดเสีย) แล้วตรวจว่าผลลัพธ์ทั้งสองแบบตรงกันทุกบรรทัด
+    """
+    rng = random.Random(seed)
+    patterns = [
+        lambda n: f"0{n}",
+        lambda n: f"+66{n}",
+        lambda n: f"66{n}",
+        lambda n: f"0{n[:2]}-{n[2:5]}-{n[5:]}",
+        lambda n: f" +66 {n[:2]} {n[2:5]} {n[5:]} ",
+        lambda n: n,
+        lambda n: f"0{n[:6]}",
+        lambda n: "ไม่มีเบอร์",
+    ]
+    lines = []
+    for _ in range(line_count):
+        digits = f"{rng.randrange(10 ** 9):09d}"
+        lines.append(rng.choice(patterns)(digits))
+    data = ("\n".join(lines) + "\n").encode('utf-8')
+    del lines
+    print(f"ข้อมูลทดสอบ {line_count:,} บรรทัด ({len(data) / 1048576:,.1f} MB)")
+
+    start = time.perf_counter()
+    expected = []
+    for line in io.StringIO(data.decode('utf-8')):
+        phone = normalize_phone(line.strip())
+        if phone:
+            expected.append(phone)
+    per_line = time.perf_counter() - start
+    print(f"normalize_phone ทีละบรรทัด: {per_line:.2f} s")
+
+    start = time.perf_counter()
+    numbers = []
+    rejected = 0
+    # ตัดก้อนแบบเดียวกับ iter_file_chunks (bytes มี find/rfind เหมือน mmap)
+    for chunk, _ in _iter_mmap_chunks(data, 0, len(data)):
+        chunk_numbers, chunk_rejected = normalize_phone_batch(chunk)
+        numbers.extend(chunk_numbers)
+        rejected += chunk_rejected
+    batch = time.perf_counter() - start
+    print(f"normalize_phone_batch:      {batch:.2f} s")
+
+    if numbers != expected or rejected != line_count - len(expected):
+        raise AssertionError("ผลลัพธ์ของ normalize_phone_batch ไม่ตรงกับ normalize_phone")
+    print(f"ผลลัพธ์ตรงกัน {len(numbers):,} เบอร์, ไม่ผ่าน {rejected:,} บรรทัด, "
+          f"เร็วขึ้น {per_line / batch:.1f} เท่า")
+
+
+def split_lines(text):
+    """แยกบรรทัดแบบเดียวกับการวนอ่านไฟล์ในโหมด text (universal newlines)"""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+# ช่องว่างที่ str.strip() ตัดออกในช่วง ASCII
+_LINE_STRIP_BYTES = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+
+
+def _stripped_lines(chunk):
+    """บรรทัดที่ไม่ว่างของก้อนข้อมูล ตัดช่องว่างหัวท้ายแบบ line.strip() คืนค่าเป็น bytes UTF-8"""
+    if chunk.isascii():
+        return [line for line in (raw.strip(_LINE_STRIP_BYTES) for raw in chunk.splitlines())
+                if line]
+    # มีอักษรที่ไม่ใช่ ASCII ใช้ str.strip() แบบเดิม เพื่อให้ตัดช่องว่างยูนิโค้ดได้เหมือนกัน
+    return [line.strip().encode('utf-8') for line in split_lines(chunk.decode('utf-8'))
+            if line.strip()]
+
+
+def combine_phone_files(file_paths, save_path, bucket_bytes=COMBINE_BUCKET_BYTES):
+    """รวมบรรทัดที่ไม่ว่างของทุกไฟล์ สลับลำดับแบบสุ่ม แล้วบันทึกลง save_path
+
+    ถ้าไฟล์รวมใหญ่กว่า bucket_bytes จะสุ่มแต่ละบรรทัดลงถังในไฟล์ชั่วคราวก่อน แล้วโหลด
+    มาสลับทีละถัง ได้ลำดับสุ่มแบบเดียวกับการสลับทั้งหมด โดยใช้หน่วยความจำแค่ราวขนาดถัง
+    คืนค่าจำนวนบรรทัดที่บันทึก
+    """
+    # เขียนแบบ binary จึงต้องใช้ตัวขึ้นบรรทัดของระบบเอง เหมือนการเขียนไฟล์โหมด text
+    newline = os.linesep.encode()
+    bytes_total = sum(os.path.getsize(path) for path in file_paths)
+    buckets = max(1, -(-bytes_total // bucket_bytes))
+    if buckets == 1:
+        lines = []
+        for chunk, _, _ in iter_file_chunks(file_paths):
+            lines.extend(_stripped_lines(chunk))
+        random.shuffle(lines)
+        with open(save_path, 'wb') as fout:
+            fout.write(newline.join(lines))
+        return len(lines)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        bucket_paths = [os.path.join(temp_dir, f"bucket_{i}.txt") for i in range(buckets)]
+        spools = [open(path, 'wb') for path in bucket_paths]
+        rand = random.random
+        try:
+            for chunk, _, _ in iter_file_chunks(file_paths):
+                parts = [[] for _ in range(buckets)]
+                appends = [part.append for part in parts]
+                for line in _stripped_lines(chunk):
+                    appends[int(rand() * buckets)](line)
+                for part, spool in zip(parts, spools):
+                    if part:
+                        spool.write(b"\n".join(part) + b"\n")
+        finally:
+            for spool in spools:
+                spool.close()
+
+        count = 0
+        with open(save_path, 'wb') as fout:
+            for path in bucket_paths:
+                with open(path, 'rb') as f:
+                    lines = f.read().splitlines()
+                os.remove(path)
+                if not lines:
+                    continue
+                random.shuffle(lines)
+                if count:
+                    fout.write(newline)
+                fout.write(newline.join(lines))
+                count += len(lines)
+        return count
+
+
+class PhoneArray:
+    """ลำดับเบอร์ 0XXXXXXXXX ที่เก็บเป็นตัวเลข 4 ไบต์ต่อเบอร์ใน array
+
+    ใช้แทน list ของ str (ราว 70 ไบต์ต่อเบอร์) ตอนพักเบอร์หลายล้านเบอร์ไว้ในหน่วยความจำ
+    อ่านทีละตัว วนลูป หรือตัดเป็นช่วง (slice) ได้เป็นข้อความเหมือน list เดิม
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self, numbers=()):
+        self.values = array('i')
+        self.extend(numbers)
+
+    @classmethod
+    def from_values(cls, values):
+        """สร้างจากเบอร์ที่เป็นตัวเลขอยู่แล้ว (เช่น array, list ของ int หรือ NumPy array)"""
+        phones = cls()
+        if np is not None and isinstance(values, np.ndarray):
+            phones.values.frombytes(values.astype(np.int32).tobytes())
+        else:
+            phones.values.extend(values)
+        return phones
+
+    def append(self, phone):
+        self.values.append(int(phone))
+
+    def extend(self, numbers):
+        """ต่อท้ายด้วยเบอร์ที่เป็น str หรือ bytes รูปแบบ 0XXXXXXXXX (เลขอารบิก ตามผลของ normalize_phone)"""
+        self.values.extend(map(int, numbers))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [f"{n:010d}" for n in self.values[index]]
+        return f"{self.values[index]:010d}"
+
+    def __iter__(self):
+        return (f"{n:010d}" for n in self.values)
+
+    def counts(self):
+        """นับเบอร์ คืนค่า (เบอร์ไม่ซ้ำ, ลำดับที่พบครั้งแรก, จำนวนครั้ง) เรียงตามลำดับที่พบครั้งแรก
+
+        ถ้ามี NumPy จะนับด้วยการ sort บน view ของ array เดิม (ไม่สร้าง object ทีละเบอร์เหมือน
+        Counter) คืนค่าเป็น NumPy array ไม่งั้นนับด้วย Counter คืนค่าเป็น list
+        ลำดับที่พบครั้งแรกใช้เรียงเท่านั้น (NumPy เป็นตำแหน่งของบรรทัด Counter เป็นลำดับของเบอร์ไม่ซ้ำ)
+        """
+        if np is not None and self.values.itemsize == 4:
+            view = np.frombuffer(self.values, dtype=np.int32)
+            # key = เบอร์ << 32 | ตำแหน่ง: sort ครั้งเดียวได้ทั้งกลุ่มของเบอร์และตำแหน่งแรกของแต่ละเบอร์
+            # (เร็วกว่า np.unique(return_index=True) ที่ต้องใช้ stable sort ราว 5 เท่า)
+            key = view.astype(np.int64)
+            key <<= 32
+            key |= np.arange(len(view), dtype=np.int64)
+            key.sort()
+            positions = (key & 0xFFFFFFFF).astype(np.int32)
+            key >>= 32
+            starts = np.flatnonzero(np.diff(key, prepend=-1))
+            del key
+            # วางจำนวนครั้งไว้ที่ตำแหน่งแรกของแต่ละเบอร์ แล้วไล่ตำแหน่งจากต้นไฟล์แทนการ argsort
+            counts_at = np.zeros(len(view), dtype=np.int32)
+            counts_at[positions[starts]] = np.diff(starts, append=len(view))
+            del positions, starts
+            first = np.flatnonzero(counts_at)
+            return view[first], first, counts_at[first]
+        counter = Counter(self.values)
+        return list(counter), range(len(counter)), list(counter.values())
+
+    def repeated(self):
+        """เบอร์ที่พบมากกว่า 1 ครั้ง เรียงตามลำดับที่พบครั้งแรก เป็น PhoneArray"""
+        unique, _, counts = self.counts()
+        if np is not None and isinstance(unique, np.ndarray):
+            return PhoneArray.from_values(unique[counts > 1])
+        return PhoneArray.from_values(n for n, count in zip(unique, counts) if count > 1)
+
+
+def _as_list(values):
+    """แปลง NumPy array เป็น list ของ int ของ Python (ส่งให้ sqlite3 ได้) ส่วนค่าอื่นคืนเดิม"""
+    return values.tolist() if np is not None and isinstance(values, np.ndarray) else values
+
+
+class ImportPreview:
+    """ผลการอ่านไฟล์ที่รอนำเข้า: เบอร์ทั้งหมด เบอร์ซ้ำในไฟล์ และเบอร์ที่มีอยู่แล้วในฐานข้อมูล
+
+    db_check คือ (table, check_all_tables, version) ของการตรวจที่ได้ db_duplicates มา
+    ใช้ตัดสินตอนบันทึกว่านำผลตรวจนี้ไปใช้ซ้ำได้หรือไม่ ส่วน file_paths คือไฟล์ต้นทาง
+    ที่ตอนบันทึกจะถูกอ่านใหม่เป็นงานนำเข้าแบบมี checkpoint และ sources คือ
+    stat_source_files ของไฟล์เหล่านั้นก่อนอ่าน (ถ้าไฟล์เปลี่ยนจะไม่ใช้ผลตรวจซ้ำ)
+    """
+
+    def __init__(self, numbers=None, file_duplicates=None, db_duplicates=None, db_check=None,
+                 file_paths=(), sources=None):
+        self.file_paths = list(file_paths)
+        self.sources = sources
+        self.numbers = numbers if numbers is not None else PhoneArray()
+        self.file_duplicates = file_duplicates if file_duplicates is not None else PhoneArray()
+        self.db_duplicates = db_duplicates if db_duplicates is not None else PhoneArray()
+        self.db_check = db_check
+
+    def known_duplicates(self, table, check_all_tables):
+        """ผลตรวจเบอร์ซ้ำในฐานข้อมูลสำหรับส่งให้ import_phone_numbers (None ถ้าตรวจคนละแบบ)"""
+        if (self.db_check is None or self.sources is None
+                or self.db_check[:2] != (table, check_all_tables)):
+            return None
+        return self.db_duplicates, self.db_check[2], self.sources
+
+
+def read_phone_files(file_paths, progress=None):
+    """อ่านและแปลงเบอร์จากทุกไฟล์ตามลำดับ คืนค่า (numbers, rejected)
+
+    numbers เป็น PhoneArray และ progress(percent, text) ถูกเรียกหลังอ่านแต่ละก้อน
+    (0-100 ตามจำนวนไบต์)
+    """
+    report = progress or (lambda percent, text="": None)
+    numbers = PhoneArray()
+    rejected = 0
+    for chunk, bytes_done, bytes_total in iter_file_chunks(file_paths):
+        chunk_numbers, chunk_rejected = normalize_phone_batch(chunk)
+        numbers.extend(chunk_numbers)
+        rejected += chunk_rejected
+        percent = (bytes_done / bytes_total) * 100 if bytes_total else 100
+        report(percent, f"กำลังโหลด {bytes_done / 1048576:,.1f} / "
+                        f"{bytes_total / 1048576:,.1f} MB")
+    return numbers, rejected
+
+
+def split_file_ranges(path, split_bytes=PARALLEL_SPLIT_BYTES):
+    """แบ่งไฟล์เป็นช่วงไบต์ [(path, start, end)] ขนาดประมาณ split_bytes
+
+    จุดแบ่งอยู่หลังตัว LF เสมอ จึงไม่มีบรรทัดไหนถูกตัดกลาง (ทั้งไฟล์ LF และ CRLF)
+    ไฟล์ที่ขึ้นบรรทัดด้วย CR อย่างเดียว และไฟล์บีบอัด จะไม่มีจุดแบ่งและอ่านเป็นช่วงเดียว
+    """
+    size = os.path.getsize(path)
+    if is_compressed_file(path):
+        return [(path, 0, size)]
+    ranges = []
+    start = 0
+    with open(path, 'rb') as f:
+        while start < size:
+            end = start + split_bytes
+            if end < size:
+                f.seek(end)
+                while True:
+                    block = f.read(65536)
+                    if not block:
+                        end = size
+                        break
+                    newline = block.find(b"\n")
+                    if newline >= 0:
+                        end += newline + 1
+                        break
+                    end += len(block)
+            ranges.append((path, start, end))
+            start = end
+    return ranges
+
+
+def _parse_phone_range(path, start, end, partitions):
+    """งานรอบที่ 1 ของ worker: แปลงเบอร์ในช่วงไบต์ [start, end) ของไฟล์
+
+    คืนค่าในรูปแบบกะทัดรัดเพื่อส่งข้าม process ได้เร็ว: (เบอร์ทั้งหมดตามลำดับเป็น array
+    ของตัวเลขแบบ PhoneArray, ผลนับเบอร์แบ่งตาม partition, จำนวนบรรทัดที่ไม่ใช่เบอร์) ผลนับของแต่ละ
+    partition คือ (เบอร์ไม่ซ้ำ, ลำดับที่พบครั้งแรกในช่วงนี้, เบอร์ที่ซ้ำกันเองในช่วงนี้)
+    เก็บเป็น array ของตัวเลข โดยเบอร์ n อยู่ partition n % partitions
+    """
+    numbers = PhoneArray()
+    rejected = 0
+    for chunk, _ in _iter_source_chunks(path, start, end):
+        chunk_numbers, chunk_rejected = normalize_phone_batch(chunk)
+        numbers.extend(chunk_numbers)
+        rejected += chunk_rejected
+
+    unique, first, counts = numbers.counts()
+    if np is not None and isinstance(unique, np.ndarray):
+        partition_of = unique % partitions
+        parts = []
+        for partition in range(partitions):
+            selected = partition_of == partition
+            parts.append(tuple(
+                array('q', values.astype(np.int64).tobytes())
+                for values in (unique[selected], first[selected],
+                               unique[selected & (counts > 1)])))
+        return numbers.values, parts, rejected
+
+    parts = [(array('q'), array('q'), array('q')) for _ in range(partitions)]
+    for n, position, count in zip(unique, first, counts):
+        unique_part, positions, duplicates = parts[n % partitions]
+        unique_part.append(n)
+        positions.append(position)
+        if count > 1:
+            duplicates.append(n)
+    return numbers.values, parts, rejected
+
+
+def _find_partition_duplicates(parts):
+    """งานรอบที่ 2 ของ worker: หาเบอร์ซ้ำของ 1 partition จากผลนับของทุกช่วงตามลำดับ
+
+    เบอร์ซ้ำคือเบอร์ที่ซ้ำกันเองในช่วงใดช่วงหนึ่ง หรือพบมากกว่า 1 ช่วง คืนค่า
+    (ลำดับที่พบครั้งแรกทั้งไฟล์, เบอร์) เรียงตามลำดับที่พบครั้งแรก
+    """
+    first_seen = {}
+    duplicates = set()
+    for range_index, (unique, positions, range_duplicates) in enumerate(parts):
+        duplicates.update(range_duplicates)
+        base = range_index << 40
+        for n, position in zip(unique, positions):
+            if n in first_seen:
+                duplicates.add(n)
+            else:
+                first_seen[n] = base | position
+    found = sorted((first_seen[n], n) for n in duplicates)
+    return array('q', (key for key, _ in found)), array('q', (n for _, n in found))
+
+
+def parse_phone_files(file_paths, progress=None, workers=None):
+    """อ่านและแปลงเบอร์จากทุกไฟล์ พร้อมหาเบอร์ที่ซ้ำกันเองในไฟล์ทั้งหมด
+
+    ถ้าไฟล์รวมใหญ่พอและเครื่องมีหลาย CPU จะกระจายไฟล์ (หรือช่วงไบต์ของไฟล์ใหญ่)
+    ให้ process pool แปลงเบอร์และนับเบอร์ในแต่ละช่วง แล้วให้ worker แต่ละตัวรวมผลนับ
+    ของเบอร์กลุ่มหนึ่ง (แบ่งตาม partition) จากทุกช่วง จึงเจอเบอร์ที่ซ้ำข้ามไฟล์/ข้ามช่วงด้วย
+    ผลที่ได้ตรงกับการอ่านทีละไฟล์ทุกประการ รวมถึงลำดับของเบอร์
+    คืนค่า (numbers, rejected, internal_duplicates) โดย numbers และ internal_duplicates
+    เป็น PhoneArray และ internal_duplicates เรียงตามลำดับที่พบครั้งแรก
+    """
+    report = progress or (lambda percent, text="": None)
+    workers = workers or os.cpu_count() or 1
+    bytes_total = sum(os.path.getsize(path) for path in file_paths)
+    if workers < 2 or bytes_total < PARALLEL_MIN_BYTES:
+        numbers, rejected = read_phone_files(file_paths, progress)
+        return numbers, rejected, numbers.repeated()
+
+    # แบ่งให้แต่ละ worker ได้งานอย่างน้อย 1 ช่วง แต่ไม่ใหญ่เกิน PARALLEL_SPLIT_BYTES
+    split_bytes = max(IMPORT_CHUNK_SIZE, min(PARALLEL_SPLIT_BYTES, -(-bytes_total // workers)))
+    ranges = [r for path in file_paths for r in split_file_ranges(path, split_bytes)]
+    results = [None] * len(ranges)
+    bytes_done = 0
+    # ใช้ spawn เพื่อไม่ fork process ที่มี thread ของ Tk/SQLite ทำงานอยู่
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(_parse_phone_range, *r, workers): index
+                   for index, r in enumerate(ranges)}
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            _, start, end = ranges[index]
+            bytes_done += end - start
+            report(bytes_done / bytes_total * 90,
+                   f"กำลังโหลด {bytes_done / 1048576:,.1f} / {bytes_total / 1048576:,.1f} MB")
+
+        report(90, "กำลังตรวจสอบเบอร์ซ้ำในไฟล์...")
+        partition_results = pool.map(
+            _find_partition_duplicates,
+            [[parts[partition] for _, parts, _ in results] for partition in range(workers)])
+        found = sorted((key, n) for keys, duplicates in partition_results
+                       for key, n in zip(keys, duplicates))
+
+    # ต่อเบอร์ตามลำดับไฟล์/ช่วง ให้ลำดับเหมือนการอ่านทีละไฟล์
+    numbers = PhoneArray()
+    rejected = 0
+    for values, _, range_rejected in results:
+        numbers.values.extend(values)
+        rejected += range_rejected
+    internal_duplicates = PhoneArray.from_values(n for _, n in found)
+    return numbers, rejected, internal_duplicates
+
+
+# เบอร์จำลองลำดับที่ i ของ benchmark: (i * 9^9 + c) mod 10^9 เป็น permutation ของ 0..10^9-1
+# (9^9 กับ 10^9 ไม่มีตัวประกอบร่วม) จึงได้เบอร์ไม่ซ้ำกันโดยไม่ต้องเก็บเบอร์ที่สร้างไปแล้ว
+_BENCH_MULTIPLIER = 9 ** 9
+_BENCH_OFFSET = 123_456_789
+_BENCH_PREFIXES = ("0", "66", "+66")
+_BENCH_INVALID_LINES = ("", "-", "N/A", "0812-34", "+66 81", "call me")
+
+
+def _bench_number(index):
+    return (index * _BENCH_MULTIPLIER + _BENCH_OFFSET) % 1_000_000_000
+
+
+def generate_phone_file(path, line_count, duplicate_ratio=0.1, invalid_ratio=0.02,
+                        prefix_mix=(0.6, 0.2, 0.2), seed=42):
+    """สร้างไฟล์เบอร์จำลองสำหรับ benchmark โดยเขียนทีละก้อน (ไม่ต้องเก็บทั้งไฟล์ใน RAM)
+
+    invalid_ratio คือสัดส่วนบรรทัดที่ไม่ใช่เบอร์, duplicate_ratio คือสัดส่วนของบรรทัดเบอร์
+    ที่ซ้ำกับเบอร์ที่มีก่อนหน้าในไฟล์ และ prefix_mix คือน้ำหนักของรูปแบบ 0 / 66 / +66
+    คืนค่า dict ของจำนวน lines, valid, unique, invalid และ bytes ของไฟล์
+    """
+    rng = random.Random(seed)
+    cum_weights = []
+    for weight in prefix_mix:
+        cum_weights.append((cum_weights[-1] if cum_weights else 0) + weight)
+    unique = 0
+    invalid = 0
+    block_size = 100_000
+    with open(path, "w", encoding="ascii", newline="\n") as f:
+        for start in range(0, line_count, block_size):
+            lines = []
+            for _ in range(min(block_size, line_count - start)):
+                if rng.random() < invalid_ratio:
+                    lines.append(rng.choice(_BENCH_INVALID_LINES))
+                    invalid += 1
+                    continue
+                if unique and rng.random() < duplicate_ratio:
+                    n = _bench_number(rng.randrange(unique))
+                else:
+                    n = _bench_number(unique)
+                    unique += 1
+                prefix = rng.choices(_BENCH_PREFIXES, cum_weights=cum_weights)[0]
+                lines.append(f"{prefix}{n:09d}")
+            f.write("\n".join(lines) + "\n")
+    return {"lines": line_count, "valid": line_count - invalid, "unique": unique,
+            "invalid": invalid, "bytes": os.path.getsize(path)}
+
+
+def _bench_prefill(path, table, rows, first_index):
+    """สร้างฐานข้อมูล benchmark ที่ table มีเบอร์จำลองลำดับ first_index ... อยู่แล้ว rows แถว"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    create_phone_data_tables(path)
+    if rows:
+        conn = connect_db(path)
+        try:
+            numbers = PhoneArray.from_values(
+                _bench_number(i) for i in range(first_index, first_index + rows))
+            import_phone_numbers(conn, table, numbers,
+                                 ("benchmark prefill", "2000-01-01", "", "", "", ""))
+        finally:
+            conn.close()
+
+
+@contextmanager
+def _bench_database(template_path, work_path):
+    """คัดลอกฐานข้อมูลต้นแบบไปที่ work_path แล้วเปิด connection ให้แต่ละการวัดได้ข้อมูลเท่ากัน"""
+    shutil.copyfile(template_path, work_path)
+    conn = connect_db(work_path)
+    try:
+        yield conn
+    finally:
+        conn.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(work_path + suffix):
+                os.remove(work_path + suffix)
+
+
+def _bench_import_phases(conn, table, numbers, dataset):
+    """รัน import_phone_numbers แล้วแบ่งเวลาตามขั้นตอนจาก progress ที่ _import_phone_batch รายงาน"""
+    # เปอร์เซ็นต์ที่แต่ละขั้นตอนเริ่ม (ตรงกับ report ใน _import_phone_batch)
+    marks = {20: "stage", 35: "db_check", 50: "insert", 80: "table16_routing"}
+    started = {}
+
+    def progress(percent, text=""):
+        if percent in marks and marks[percent] not in started:
+            started[marks[percent]] = time.perf_counter()
+
+    start = time.perf_counter()
+    counts = import_phone_numbers(conn, table, numbers, dataset, progress)
+    end = time.perf_counter()
+    phases = {}
+    previous_name, previous_time = "count_in_file", start
+    for name in marks.values():
+        phases[previous_name] = round(started[name] - previous_time, 3)
+        previous_name, previous_time = name, started[name]
+    phases[previous_name] = round(end - previous_time, 3)
+    return phases, counts
+
+
+def benchmark_import(line_counts, table_sizes, duplicate_ratio=0.1, invalid_ratio=0.02,
+                     prefix_mix=(0.6, 0.2, 0.2), workdir=None, seed=42, progress=None):
+    """วัดเวลาแต่ละขั้นตอนของการโหลดไฟล์และบันทึกลงฐานข้อมูลด้วยไฟล์เบอร์จำลอง
+
+    ทุกขนาดไฟล์ใน line_counts จะถูกวัดกับ table ปลายทางที่มีเบอร์อยู่แล้วตาม table_sizes
+    (ครึ่งหลังของเบอร์ในไฟล์ซ้ำกับเบอร์ที่เติมไว้) ขั้นตอนที่วัด:
+    read/normalize/dedup_in_file (ฝั่ง load_files แบบ process เดียว), load_files_parse
+    (parse_phone_files แบบที่หน้าต่างโปรแกรมใช้), db_dedup (find_db_duplicates),
+    ขั้นตอนของ import_phone_numbers (count_in_file, stage, db_check, insert,
+    table16_routing) และ save_import_job (import_phone_files ที่ save_to_database ใช้)
+    คืนค่า report เป็น dict ที่บันทึกเป็น JSON ได้
+    """
+    report_progress = progress or (lambda text: None)
+    table = PHONE_TABLES[0]
+    dataset = ("benchmark", "2000-01-01", "", "", "", "")
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "platform": sys.platform,
+        "cpu_count": os.cpu_count(),
+        "schema_version": len(SCHEMA_MIGRATIONS),
+        "params": {"duplicate_ratio": duplicate_ratio, "invalid_ratio": invalid_ratio,
+                   "prefix_mix": list(prefix_mix), "seed": seed,
+                   "import_checkpoint_bytes": IMPORT_CHECKPOINT_BYTES},
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory(dir=workdir) as temp_dir:
+        phone_path = os.path.join(temp_dir, "phones.txt")
+        template_path = os.path.join(temp_dir, "template.db")
+        work_path = os.path.join(temp_dir, "work.db")
+        for line_count in line_counts:
+            report_progress(f"สร้างไฟล์จำลอง {line_count:,} บรรทัด...")
+            start = time.perf_counter()
+            file_stats = generate_phone_file(phone_path, line_count, duplicate_ratio,
+                                             invalid_ratio, prefix_mix, seed)
+            generate_time = time.perf_counter() - start
+
+            # ฝั่ง load_files: อ่าน / แปลงเบอร์ / หาเบอร์ซ้ำในไฟล์ แยกเวลากัน
+            start = time.perf_counter()
+            for _ in iter_file_chunks([phone_path]):
+                pass
+            read_time = time.perf_counter() - start
+            normalize_time = 0.0
+            numbers = PhoneArray()
+            for chunk, _, _ in iter_file_chunks([phone_path]):
+                start = time.perf_counter()
+                chunk_numbers, _ = normalize_phone_batch(chunk)
+                numbers.extend(chunk_numbers)
+                normalize_time += time.perf_counter() - start
+            start = time.perf_counter()
+            file_duplicates = len(numbers.repeated())
+            dedup_time = time.perf_counter() - start
+            start = time.perf_counter()
+            parse_phone_files([phone_path])
+            load_parse_time = time.perf_counter() - start
+
+            for table_rows in table_sizes:
+                report_progress(f"{line_count:,} บรรทัด กับ table {table_rows:,} แถว...")
+                _bench_prefill(template_path, table, table_rows, file_stats["unique"] // 2)
+                phases = {
+                    "generate": round(generate_time, 3),
+                    "read": round(read_time, 3),
+                    "normalize": round(normalize_time, 3),
+                    "dedup_in_file": round(dedup_time, 3),
+                    "load_files_parse": round(load_parse_time, 3),
+                }
+                with _bench_database(template_path, work_path) as conn:
+                    start = time.perf_counter()
+                    db_duplicates, _ = find_db_duplicates(conn, table, numbers)
+                    phases["db_dedup"] = round(time.perf_counter() - start, 3)
+                with _bench_database(template_path, work_path) as conn:
+                    import_phases, counts = _bench_import_phases(conn, table, numbers, dataset)
+                    phases.update(import_phases)
+                with _bench_database(template_path, work_path) as conn:
+                    known = (*find_db_duplicates(conn, table, numbers),
+                             stat_source_files([phone_path]))
+                    start = time.perf_counter()
+                    job_counts = import_phone_files(conn, [phone_path], table, dataset,
+                                                    known_duplicates=known)
+                    phases["save_import_job"] = round(time.perf_counter() - start, 3)
+                if tuple(job_counts) != tuple(counts):
+                    raise AssertionError("ผลนำเข้าแบบงานนำเข้าไม่ตรงกับแบบ transaction เดียว")
+
+                new_count, duplicate_count, db_duplicate_count = counts
+                report["runs"].append({
+                    "lines": line_count,
+                    "table_rows": table_rows,
+                    "file": file_stats,
+                    "counts": {"numbers": len(numbers), "file_duplicate_numbers": file_duplicates,
+                               "db_duplicate_numbers": len(db_duplicates),
+                               "new": new_count, "table16": duplicate_count,
+                               "skipped_in_db": db_duplicate_count},
+                    "seconds": phases,
+                    "lines_per_second": {
+                        "load": round(line_count / max(load_parse_time, 1e-9)),
+                        "save": round(line_count / max(phases["save_import_job"], 1e-9)),
+                    },
+                })
+            del numbers
+    return report
+
+
+class TaskCancelled(Exception):
+    """งานเบื้องหลังถูกยกเลิกจากปุ่มยกเลิก (BackgroundTask.cancel)"""
+
+
+# จำนวน worker thread ที่รันงานฐานข้อมูลของหน้าจอ (reader/writer แต่ละตัวใช้ได้ทีละงานอยู่แล้ว)
+DB_WORKER_THREADS = 4
+
+
+class BackgroundTask:
+    """รันงานหนักใน worker thread แล้วส่ง progress/ผลลัพธ์กลับมาที่ Tk ผ่าน after()
+
+    worker เรียก report() ได้บ่อยเท่าที่ต้องการ ฝั่ง Tk จะอ่านเฉพาะค่าล่าสุด
+    ทุก POLL_MS มิลลิวินาที จึงไม่ต้องวาดหน้าจอใหม่ทุกบรรทัด ถ้าให้ executor
+    งานจะรันบน executor นั้นแทนการเปิด thread ใหม่
+
+    cancel() (เรียกจาก Tk) ทำให้ report() ครั้งถัดไปโยน TaskCancelled และ interrupt
+    คำสั่ง SQL ที่กำลังรันบน connection ที่ worker ลงทะเบียนไว้ด้วย use() งานที่ถูกยกเลิก
+    จะเรียก on_cancel แทน on_error
+    """
+
+    POLL_MS = 100
+
+    def __init__(self, root, work, on_progress=None, on_done=None, on_error=None,
+                 on_cancel=None, executor=None):
+        self.root = root
+        self.work = work
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.executor = executor
+        self.cancelled = False
+        self._connection = None
+        self._lock = threading.Lock()
+        self._results = queue.Queue()
+        self._progress = None
+        self._shown_progress = None
+
+    def start(self):
+        if self.executor is not None:
+            self.executor.submit(self._run)
+        else:
+            threading.Thread(target=self._run, daemon=True).start()
+        self.root.after(self.POLL_MS, self._poll)
+        return self
+
+    def report(self, percent, text=""):
+        """เรียกจาก worker thread เพื่อแจ้งความคืบหน้า (percent เป็น None ถ้ายังไม่รู้ยอดรวม)"""
+        if self.cancelled:
+            raise TaskCancelled()
+        self._progress = (percent, text)
+
+    @contextmanager
+    def use(self, conn):
+        """ลงทะเบียน conn ระหว่าง block ให้ cancel() หยุดคำสั่งที่กำลังรันได้ด้วย interrupt()"""
+        with self._lock:
+            if self.cancelled:
+                raise TaskCancelled()
+            self._connection = conn
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                self._connection = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._connection is not None:
+                self._connection.interrupt()
+
+    def _run(self):
+        try:
+            result = self.work(self)
+        except Exception as e:
+            # คำสั่งที่ถูก interrupt จะได้ sqlite3.OperationalError("interrupted")
+            if self.cancelled and isinstance(e, (TaskCancelled, sqlite3.OperationalError)):
+                self._results.put(("cancelled", e))
+            else:
+                self._results.put(("error", e))
+        else:
+            self._results.put(("done", result))
+
+    def _poll(self):
+        progress = self._progress
+        if progress is not None and progress != self._shown_progress:
+            self._shown_progress = progress
+            if self.on_progress:
+                self.on_progress(*progress)
+
+        try:
+            status, payload = self._results.get_nowait()
+        except queue.Empty:
+            self.root.after(self.POLL_MS, self._poll)
+            return
+
+        if status == "done":
+            if self.on_done:
+                self.on_done(payload)
+        elif status == "cancelled":
+            if self.on_cancel:
+                self.on_cancel()
+        elif self.on_error:
+            self.on_error(payload)
+
+
+class ProgressWindow:
+    """หน้าต่าง progress ของงานเบื้องหลัง: ข้อความ, progress bar, สถานะ และปุ่มยกเลิก
+
+    update_progress(None, text) แสดง bar แบบวิ่งไปมาสำหรับคำสั่งที่ยังไม่รู้ยอดรวม
+    (ถือ Toplevel ไว้ใน window แทนการสืบทอด จึงประกาศ class ได้แม้ไม่มี tkinter)
+    """
+
+    def __init__(self, root, title, message, on_cancel=None):
+        self.window = window = tk.Toplevel(root)
+        window.title(title)
+        window.geometry("400x130" if on_cancel else "400x100")
+        window.resizable(False, False)
+        window.transient(root)
+        tk.Label(window, text=message, font=("Kanit", 10)).pack(pady=(10, 5))
+
+        self.progress_var = tk.DoubleVar()
+        self.progress_bar = ttk.Progressbar(window, maximum=100, variable=self.progress_var)
+        self.progress_bar.pack(fill=tk.X, padx=20, pady=5)
+
+        self.status = tk.Label(window, text="", font=("Kanit", 9))
+        self.status.pack()
+        if on_cancel:
+            self.cancel_button = ttk.Button(window, text="ยกเลิก", command=self._cancel)
+            self.cancel_button.pack(pady=(5, 0))
+            window.protocol("WM_DELETE_WINDOW", self._cancel)
+            self._on_cancel = on_cancel
+        # กันไม่ให้กดปุ่มอื่นระหว่างที่ worker ยังทำงานอยู่
+        window.grab_set()
+
+    def destroy(self):
+        self.window.destroy()
+
+    def update_progress(self, percent, text=""):
+        if percent is None:
+            if str(self.progress_bar.cget("mode")) != "indeterminate":
+                self.progress_bar.configure(mode="indeterminate")
+                self.progress_bar.start(15)
+        else:
+            if str(self.progress_bar.cget("mode")) != "determinate":
+                self.progress_bar.stop()
+                self.progress_bar.configure(mode="determinate")
+            self.progress_var.set(percent)
+        self.status.config(text=text)
+
+    def _cancel(self):
+        self.cancel_button.configure(state="disabled")
+        self.status.config(text="กำลังยกเลิก...")
+        self._on_cancel()
+
+
+class VirtualListBox:
+    """กล่องแสดงรายการยาวๆ แบบอ่านอย่างเดียว ที่วาดเฉพาะบรรทัดที่มองเห็นอยู่
+
+    items เป็นอะไรก็ได้ที่มี len() และตัดช่วงด้วย slice ได้ (เช่น PhoneArray) กล่องจะดึง
+    ทีละหน้าตอนเลื่อน จึงเปิดรายการหลายล้านบรรทัดได้ทันทีโดยไม่ต้องใส่ข้อความทั้งหมดลงใน Tk
+    วางกล่องด้วย pack() เหมือน widget ทั่วไป (ตัว Frame อยู่ใน frame)
+    """
+
+    WHEEL_ROWS = 3
+
+    def __init__(self, parent, width, height, font):
+        self.frame = tk.Frame(parent)
+        self.items = ()
+        self.offset = 0
+        self.rows = height
+        self.text = tk.Text(self.frame, width=width, height=height, font=font,
+                            wrap=tk.NONE, state=tk.DISABLED)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL,
+                                       command=self._on_scrollbar)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # คืนค่า "break" เพื่อไม่ให้ binding ของ Text หรือ bind_all ของแท็บอื่นเลื่อนซ้ำ
+        self.text.bind("<MouseWheel>", self._on_mousewheel)
+        self.text.bind("<Button-4>", lambda event: self.scroll_to(self.offset - self.WHEEL_ROWS))
+        self.text.bind("<Button-5>", lambda event: self.scroll_to(self.offset + self.WHEEL_ROWS))
+        self.text.bind("<Prior>", lambda event: self.scroll_to(self.offset - self.rows))
+        self.text.bind("<Next>", lambda event: self.scroll_to(self.offset + self.rows))
+        self.text.bind("<Up>", lambda event: self.scroll_to(self.offset - 1))
+        self.text.bind("<Down>", lambda event: self.scroll_to(self.offset + 1))
+        self._render()
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def set_items(self, items):
+        self.items = items
+        self.offset = 0
+        self._render()
+
+    def scroll_to(self, offset):
+        self.offset = max(0, min(offset, len(self.items) - self.rows))
+        self._render()
+        return "break"
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(value) * len(self.items)))
+        else:
+            step = self.rows if unit == "pages" else 1
+            self.scroll_to(self.offset + int(value) * step)
+
+    def _on_mousewheel(self, event):
+        return self.scroll_to(self.offset + (-self.WHEEL_ROWS if event.delta > 0 else self.WHEEL_ROWS))
+
+    def _render(self):
+        total = len(self.items)
+        visible = self.items[self.offset:self.offset + self.rows]
+        self.text.config(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", "\n".join(visible))
+        self.text.config(state=tk.DISABLED)
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + len(visible)) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+
+# ตัวเลือกวิธีค้นเบอร์ในแท็บจัดการข้อมูล เรียงตาม PHONE_MATCH_MODES
+MANAGE_PHONE_MATCH_LABELS = ["มีเลขนี้", "ขึ้นต้นด้วย"]
+
+
+class KeysetPager:
+    """เติมแถวลง Treeview ทีละหน้าตามการเลื่อน โดยค้างแถวไว้ไม่เกิน max_rows แถว
+
+    fetch(task, after_id=..., before_id=...) คืนแถวไม่เกิน page_rows แถวเรียงตาม id (คอลัมน์แรก)
+    และรันใน worker thread ผ่าน run(work, on_done, on_error=..., on_cancel=...) (เช่น
+    PhoneDataManager.run_db_task) จึงควรใช้ connection ผ่าน task.use(conn)
+    เมื่อเลื่อนใกล้ท้าย (หรือต้น) ของแถวที่โหลดไว้จะดึงหน้าถัดไป (หรือก่อนหน้า) ต่อจาก id
+    ของแถวสุดท้าย (หรือแรก) แล้วตัดแถวฝั่งตรงข้ามที่เกิน max_rows ทิ้ง
+    ระหว่างรอหน้าใหม่ (loading) จะไม่ส่งคำขอซ้ำ และผลที่มาถึงหลัง reset() จะถูกทิ้ง
+    """
+
+    # โหลดหน้าใหม่เมื่อแถวที่ยังไม่เห็นเหลือน้อยกว่าสัดส่วนนี้ของแถวที่โหลดไว้
+    PREFETCH = 0.2
+
+    def __init__(self, tree, scrollbar, run, page_rows=MANAGE_PAGE_ROWS,
+                 max_rows=MANAGE_WINDOW_ROWS):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.run = run
+        self.page_rows = page_rows
+        self.max_rows = max_rows
+        self.fetch = None
+        self.at_start = True
+        self.at_end = True
+        self.loading = False
+        # เพิ่มทุกครั้งที่ reset ใช้แยกผลของคำขอเก่าที่ยังค้างอยู่
+        self._generation = 0
+        self._pending = None
+        tree.configure(yscrollcommand=self._on_yscroll)
+
+    def reset(self, fetch, rows=None):
+        """ล้าง Treeview แล้วแสดงหน้าแรกของ fetch ใหม่
+
+        rows คือหน้าแรกที่ดึงไว้แล้ว (เช่นใน worker เดียวกับที่นับแถว) ถ้าไม่ให้จะดึงผ่าน run
+        """
+        self.fetch = fetch
+        self._generation += 1
+        self.loading = False
+        self.tree.delete(*self.tree.get_children())
+        self.at_start = True
+        self.at_end = False
+        if rows is None:
+            self._request(self._load_next)
+        else:
+            self._load_next(rows)
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self._pending is None and self.fetch is not None and not self.loading:
+            self._pending = self.tree.after_idle(self._check)
+
+    def _check(self):
+        self._pending = None
+        if self.fetch is None or self.loading:
+            return
+        first, last = (float(value) for value in self.tree.yview())
+        if last >= 1 - self.PREFETCH and not self.at_end:
+            self._request(self._load_next)
+        elif first <= self.PREFETCH and not self.at_start:
+            self._request(self._load_previous)
+
+    def _request(self, load):
+        """ดึงหน้าถัดไป/ก่อนหน้าใน worker แล้วเรียก load(rows) บน Tk"""
+        items = self.tree.get_children()
+        if load == self._load_next:
+            bounds = {"after_id": int(items[-1]) if items else None}
+        else:
+            bounds = {"before_id": int(items[0])}
+        fetch, generation = self.fetch, self._generation
+        self.loading = True
+
+        def current():
+            if generation != self._generation:
+                return False
+            self.loading = False
+            return True
+
+        def done(rows):
+            if current():
+                load(rows)
+                # แถวที่เพิ่มอาจยังไม่พอถึงตำแหน่งที่เลื่อนไปแล้ว ตรวจซ้ำอีกรอบ
+                self._on_yscroll(*self.tree.yview())
+
+        def error(e):
+            if current():
+                # หยุดโหลดเพิ่มจนกว่าจะค้นหาใหม่ ไม่งั้นจะแจ้ง error ซ้ำทุกครั้งที่เลื่อน
+                self.fetch = None
+                messagebox.showerror("Database Error", str(e))
+
+        self.run(lambda task: fetch(task, **bounds), done, on_error=error, on_cancel=current)
+
+    def _top_index(self, count):
+        return round(float(self.tree.yview()[0]) * count)
+
+    def _load_next(self, rows):
+        items = self.tree.get_children()
+        if len(rows) < self.page_rows:
+            self.at_end = True
+        top = self._top_index(len(items))
+        for row in rows:
+            self.tree.insert("", "end", iid=row[0], values=row)
+        items = self.tree.get_children()
+        overflow = len(items) - self.max_rows
+        if overflow > 0:
+            self.tree.delete(*items[:overflow])
+            self.at_start = False
+            self.tree.yview_moveto(max(0, top - overflow) / self.max_rows)
+
+    def _load_previous(self, rows):
+        items = self.tree.get_children()
+        if len(rows) < self.page_rows:
+            self.at_start = True
+        top = self._top_index(len(items))
+        for row in reversed(rows):
+            self.tree.insert("", 0, iid=row[0], values=row)
+        items = self.tree.get_children()
+        overflow = len(items) - self.max_rows
+        if overflow > 0:
+            self.tree.delete(*items[-overflow:])
+            self.at_end = False
+        self.tree.yview_moveto((top + len(rows)) / min(len(items), self.max_rows))
+
+
 class PhoneDataManager:
     def __init__(self, root):
         self.root = root
@@ -39,8 +2833,70 @@ class PhoneDataManager:
         self.root.geometry("1200x700")
         self.root.configure(bg="#f0f2f5")
 
+        # connection ของฐานข้อมูลที่ใช้ร่วมกันทั้งโปรแกรม (ปิดตอนปิดหน้าต่าง)
+        self.db = ConnectionManager()
+        # ผลลัพธ์ query ของแท็บต่างๆ ที่เรียกซ้ำบ่อย ทุกงานที่เขียนต้องเรียก query_cache.invalidate
+        self.query_cache = QueryCache()
+        # งานฐานข้อมูลทั้งหมดรันบน executor นี้ (ดู run_db_task) หน้าต่างจึงไม่ค้างระหว่าง query
+        self.db_executor = ThreadPoolExecutor(DB_WORKER_THREADS, thread_name_prefix="db")
+        self.db_tasks = set()
+        # เบอร์ที่อ่านจากไฟล์และรอนำเข้า (กล่องทั้ง 3 ในแท็บนำเข้าแสดงจากตัวนี้)
+        self.import_preview = ImportPreview()
+
         self.setup_styles()
         self.create_tabs()
+        # ถามทันทีถ้ามีงานนำเข้าที่ค้างจากการล่ม/ปิดโปรแกรมครั้งก่อน
+        self.root.after(500, lambda: self.resume_import_jobs(startup=True))
+
+    def close(self):
+        """ยกเลิกงานฐานข้อมูลที่ยังรันอยู่ แล้วปิด connection (เรียกหลังปิดหน้าต่าง)"""
+        for task in list(self.db_tasks):
+            task.cancel()
+        self.db_executor.shutdown(cancel_futures=True)
+        self.db.close()
+
+    def run_db_task(self, work, on_done=None, title=None, message="", on_error=None,
+                    on_cancel=None):
+        """รัน work(task) บน db_executor แล้วเรียก on_done(result) ใน Tk ผ่าน after()
+
+        work ต้องไม่แตะ widget ของ Tk (อ่านค่าจากหน้าจอก่อนเรียก) และควรใช้ connection
+        ผ่าน task.use(conn) ให้ปุ่มยกเลิกหยุดคำสั่ง SQL ได้ ถ้าให้ title จะแสดง ProgressWindow
+        พร้อมปุ่มยกเลิกระหว่างรัน error แสดงเป็น messagebox ถ้าไม่ได้ให้ on_error
+        """
+        window = None
+
+        def finish():
+            self.db_tasks.discard(task)
+            if window is not None:
+                window.destroy()
+
+        def done(result):
+            finish()
+            if on_done:
+                on_done(result)
+
+        def error(e):
+            finish()
+            if on_error:
+                on_error(e)
+            else:
+                messagebox.showerror("Database Error", str(e))
+
+        def cancelled():
+            finish()
+            if on_cancel:
+                on_cancel()
+
+        def progress(percent, text):
+            if window is not None:
+                window.update_progress(percent, text)
+
+        task = BackgroundTask(self.root, work, progress, done, error, cancelled,
+                              self.db_executor)
+        if title:
+            window = ProgressWindow(self.root, title, message, task.cancel)
+        self.db_tasks.add(task)
+        return task.start()
 
     def setup_styles(self):
         style = ttk.Style()
@@ -87,8 +2943,7 @@ class PhoneDataManager:
         self.combine_file2 = tk.StringVar()
 
         def browse_file(var):
-            path = filedialog.askopenfilename(
-                filetypes=[("Text Files", "*.txt")])
+            path = filedialog.askopenfilename(filetypes=PHONE_FILE_TYPES)
             if path:
                 var.set(path)
 
@@ -101,13 +2956,8 @@ class PhoneDataManager:
             if not save_path:
                 return
             try:
-                with open(self.combine_file1.get(), 'r', encoding='utf-8') as f1, \
-                        open(self.combine_file2.get(), 'r', encoding='utf-8') as f2:
-                    lines = [line.strip() for line in f1 if line.strip()] + \
-                        [line.strip() for line in f2 if line.strip()]
-                random.shuffle(lines)
-                with open(save_path, 'w', encoding='utf-8') as fout:
-                    fout.write('\n'.join(lines))
+                combine_phone_files(
+                    [self.combine_file1.get(), self.combine_file2.get()], save_path)
                 messagebox.showinfo(
                     "Success", f"รวมไฟล์เรียบร้อยแล้ว\nบันทึกที่: {save_path}")
             except Exception as e:
@@ -192,9 +3042,6 @@ class PhoneDataManager:
         ttk.Button(frame, text="ย้ายข้อมูลที่เลือก",
                    command=self.move_selected_datasets).pack(pady=10)
         
-    def get_db_connection(self):
-        return sqlite3.connect("phone_data.db")
-
     def load_datasets_from_source(self, event=None):
         for widget in self.dataset_checkbox_frame.winfo_children():
             widget.destroy()
@@ -203,13 +3050,17 @@ class PhoneDataManager:
         if not table:
             return
 
-        try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT DISTINCT dataset_name FROM {table}")
-            dataset_names = [row[0] for row in cursor.fetchall()]
-            conn.close()
+        def work(task):
+            with self.db.reader() as conn, task.use(conn):
+                return self.query_cache.get(
+                    conn, table, "datasets", lambda conn: list_table_datasets(conn, table))
 
+        def on_done(dataset_names):
+            # ถ้าเลือก Table ซ้ำหลายครั้งติดกัน แสดงเฉพาะผลของครั้งล่าสุด
+            if table != self.move_source_table_var.get():
+                return
+            for widget in self.dataset_checkbox_frame.winfo_children():
+                widget.destroy()
             self.dataset_vars = {}
             for name in dataset_names:
                 var = tk.BooleanVar()
@@ -218,8 +3069,7 @@ class PhoneDataManager:
                 cb.pack(fill=tk.X, padx=10, pady=2, anchor='w')
                 self.dataset_vars[name] = var
 
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
+        self.run_db_task(work, on_done)
 
     def move_selected_datasets(self):
         source_table = self.move_source_table_var.get()
@@ -241,61 +3091,15 @@ class PhoneDataManager:
 
         delete_after_move = self.delete_after_move_var.get()
 
-        # Progress Window
-        progress_window = tk.Toplevel(self.root)
-        progress_window.title("กำลังย้ายข้อมูล...")
-        progress_window.geometry("400x100")
-        tk.Label(progress_window, text="กำลังย้ายข้อมูลระหว่าง Table...",
-                 font=("Kanit", 10)).pack(pady=(10, 5))
-        progress_var = tk.DoubleVar()
-        progress_bar = ttk.Progressbar(
-            progress_window, maximum=100, variable=progress_var)
-        progress_bar.pack(fill=tk.X, padx=20, pady=5)
-        status_label = tk.Label(progress_window, text="", font=("Kanit", 9))
-        status_label.pack()
-        progress_window.update()
-
-        try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-
-            total_moved = 0
-            for idx, dataset in enumerate(selected_datasets):
-                cursor.execute(f"""
-                    SELECT phone_number, dataset_name, receive_date, source, detail, data_type, created_at, is_exported
-                    FROM {source_table} WHERE dataset_name = ?
-                """, (dataset,))
-                records = cursor.fetchall()
-
-                if records:
-                    insert_query = f"""
-                        INSERT INTO {dest_table}
-                        (phone_number, dataset_name, receive_date, source, detail, data_type, created_at, is_exported)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """
-
-                    batch_size = 1000
-                    for i in range(0, len(records), batch_size):
-                        batch = records[i:i+batch_size]
-                        cursor.executemany(insert_query, batch)
-                        conn.commit()
-                        total_moved += len(batch)
-
-                    # ลบต้นทางเฉพาะเมื่อเลือกให้ลบ
-                    if delete_after_move:
-                        cursor.execute(
-                            f"DELETE FROM {source_table} WHERE dataset_name = ?", (dataset,))
-                        conn.commit()
-
-                percent = ((idx + 1) / len(selected_datasets)) * 100
-                progress_var.set(percent)
-                status_label.config(
-                    text=f"ย้าย {dataset} แล้ว ({idx+1}/{len(selected_datasets)})")
-                progress_window.update()
-
-            conn.close()
-            progress_window.destroy()
+        def work(task):
+            try:
+                with self.db.writer() as conn, task.use(conn):
+                    return move_datasets(conn, source_table, dest_table, selected_datasets,
+                                         delete_after_move, task.report)
+            finally:
+                self.query_cache.invalidate(source_table, dest_table)
 
+        def on_done(total_moved):
             if delete_after_move:
                 messagebox.showinfo(
                     "Success", f"ย้ายข้อมูลเรียบร้อยแล้ว ({total_moved} เบอร์)")
@@ -305,12 +3109,13 @@ class PhoneDataManager:
 
             self.load_datasets_from_source()
 
-        except Exception as e:
-            progress_window.destroy()
-            messagebox.showerror("Database Error", str(e))
+        self.run_db_task(work, on_done, "กำลังย้ายข้อมูล...", "กำลังย้ายข้อมูลระหว่าง Table...",
+                         on_cancel=lambda: messagebox.showinfo(
+                             "ยกเลิกแล้ว", "ยกเลิกการย้ายข้อมูลแล้ว (ไม่มีชุดข้อมูลใดถูกย้าย)"))
 
     def reset_manage_filters(self):
         self.search_phone_var.set("")
+        self.search_phone_match_var.set(MANAGE_PHONE_MATCH_LABELS[0])
         self.search_dataset_var.set("")
         self.search_dataset_combo['values'] = []
         self.load_manage_data()
@@ -322,19 +3127,41 @@ class PhoneDataManager:
             self.search_dataset_combo['values'] = []
             return
 
-        try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT DISTINCT dataset_name FROM {table} ORDER BY dataset_name")
-            dataset_names = [row[0] for row in cursor.fetchall()]
-            conn.close()
+        def work(task):
+            with self.db.reader() as conn, task.use(conn):
+                return self.query_cache.get(
+                    conn, table, "datasets", lambda conn: list_table_datasets(conn, table))
 
+        def on_done(dataset_names):
+            if table != self.manage_table_var.get():
+                return
             # เพิ่มตัวเลือก "ทั้งหมด" ไว้ด้านบน
             self.search_dataset_combo['values'] = [""] + dataset_names
             self.search_dataset_var.set("")  # รีเซ็ตค่าที่เลือก
 
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
+        self.run_db_task(work, on_done)
+
+    def show_phone_locations(self):
+        """แสดงว่าเบอร์ที่กรอกในช่องค้นหาอยู่ Table/ชุดข้อมูลไหนบ้าง"""
+        phone = normalize_phone(self.search_phone_var.get())
+        if not phone:
+            messagebox.showerror("Error", "กรุณากรอกเบอร์โทรให้ครบ 10 หลัก")
+            return
+
+        def work(task):
+            with self.db.reader() as conn, task.use(conn):
+                return find_phone_locations(conn, phone)
+
+        def on_done(locations):
+            if not locations:
+                messagebox.showinfo("ผลการค้นหา", f"ไม่พบเบอร์ {phone} ในทุก Table")
+                return
+
+            lines = "\n".join(f"- {table}: {dataset} ({count} แถว)"
+                              for table, dataset, count in locations)
+            messagebox.showinfo("ผลการค้นหา", f"เบอร์ {phone} อยู่ใน:\n\n{lines}")
+
+        self.run_db_task(work, on_done)
 
     def load_manage_data(self):
         table = self.manage_table_var.get()
@@ -358,83 +3185,39 @@ class PhoneDataManager:
         if not table:
             return
 
-        # Progress Window
-        progress_window = tk.Toplevel(self.root)
-        progress_window.title("กำลังค้นหาข้อมูล...")
-        progress_window.geometry("400x100")
-        progress_window.resizable(False, False)
-        tk.Label(progress_window, text="กำลังดึงข้อมูลจากฐานข้อมูล...",
-                 font=("Kanit", 10)).pack(pady=(10, 5))
-
-        progress_var = tk.DoubleVar()
-        progress_bar = ttk.Progressbar(
-            progress_window, maximum=100, variable=progress_var)
-        progress_bar.pack(fill=tk.X, padx=20, pady=5)
+        phone_match = PHONE_MATCH_MODES[
+            MANAGE_PHONE_MATCH_LABELS.index(self.search_phone_match_var.get())]
+        filters = {"phone": phone_filter, "dataset": dataset_filter,
+                   "date_from": date_from, "date_to": date_to, "phone_match": phone_match}
+
+        filter_key = tuple(sorted(filters.items()))
+
+        def fetch(task, after_id=None, before_id=None):
+            with self.db.reader() as conn, task.use(conn):
+                return self.query_cache.get(
+                    conn, table, ("manage_page", filter_key, after_id, before_id),
+                    lambda conn: fetch_manage_page(conn, table, filters, after_id, before_id))
+
+        def work(task):
+            # นับจำนวนแถวและเบอร์ซ้ำใน SQL แยกจากการดึงแถว ซึ่งดึงเฉพาะหน้าที่เห็นตามการเลื่อน
+            task.report(None, "กำลังนับแถวและเบอร์ซ้ำ...")
+            with self.db.reader() as conn, task.use(conn):
+                total_count, duplicate_count = self.query_cache.get(
+                    conn, table, ("manage_stats", filter_key),
+                    lambda conn: manage_row_stats(conn, table, filters))
+            task.report(None, f"พบ {total_count:,} รายการ กำลังดึงหน้าแรก...")
+            return total_count, duplicate_count, fetch(task)
+
+        def on_done(result):
+            total_count, duplicate_count, rows = result
+            # หน้าถัดๆ ไป pager ดึงต่อบน db_executor ตอนเลื่อน (ไม่แสดงหน้าต่างความคืบหน้า)
+            self.manage_pager.reset(fetch, rows)
 
-        progress_status = tk.Label(progress_window, text="", font=("Kanit", 9))
-        progress_status.pack()
-        progress_window.update()
-
-        try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-
-            query = f"""
-                SELECT id, phone_number, dataset_name, receive_date, source, data_type, created_at
-                FROM {table} WHERE 1
-            """
-            params = []
-
-            if phone_filter:
-                query += " AND phone_number LIKE ?"
-                params.append(f"%{phone_filter}%")
-            if dataset_filter:
-                query += " AND dataset_name LIKE ?"
-                params.append(f"%{dataset_filter}%")
-            if date_from:
-                query += " AND receive_date >= ?"
-                params.append(date_from)
-            if date_to:
-                query += " AND receive_date <= ?"
-                params.append(date_to)
-
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-
-            progress_var.set(50)
-            progress_status.config(text="กำลังแสดงข้อมูล...")
-            progress_window.update()
-
-            for i in self.tree.get_children():
-                self.tree.delete(i)
-
-            for row in rows:
-                self.tree.insert("", "end", values=row)
-
-            progress_var.set(80)
-            progress_status.config(text="กำลังตรวจสอบเบอร์ซ้ำ...")
-            progress_window.update()
-
-            # ตรวจสอบเบอร์ซ้ำ
-            phone_numbers = [row[1] for row in rows]
-            duplicate_count = sum(
-                count > 1 for count in Counter(phone_numbers).values())
-
-            total_count = len(rows)
             self.count_label.config(
                 text=f"แสดงทั้งหมด {total_count} รายการ, ซ้ำ {duplicate_count} รายการ"
             )
 
-            progress_var.set(100)
-            progress_status.config(text="เสร็จสิ้น")
-            progress_window.update()
-            progress_window.destroy()
-
-            conn.close()
-
-        except Exception as e:
-            progress_window.destroy()
-            messagebox.showerror("Database Error", str(e))
+        self.run_db_task(work, on_done, "กำลังค้นหาข้อมูล...", "กำลังดึงข้อมูลจากฐานข้อมูล...")
 
     def setup_export_tab(self):
         frame = tk.Frame(self.tab_export, bg="#f0f2f5")
@@ -542,37 +3325,20 @@ class PhoneDataManager:
         if not file_path:
             return
 
-        try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-
-            all_numbers = []
-
-            for dataset_name, limit in selected_data:
-                cursor.execute(f"""
-                    SELECT id, phone_number FROM {table}
-                    WHERE dataset_name = ?
-                    ORDER BY is_exported ASC, id ASC
-                    LIMIT ?
-                """, (dataset_name, limit))
-                results = cursor.fetchall()
-                ids = [row[0] for row in results]
-                numbers = [row[1] for row in results]
-                all_numbers.extend(numbers)
-
-                # อัปเดต is_exported = 1
-                if ids:
-                    cursor.execute(
-                        f"UPDATE {table} SET is_exported = 1 WHERE id IN ({','.join(['?'] * len(ids))})", ids
-                    )
-                    conn.commit()
+        inject_file_path = self.inject_file_path if self.inject_extra_var.get() else None
 
-            conn.close()
+        def work(task):
+            try:
+                with self.db.writer() as conn, task.use(conn):
+                    return export_phone_numbers(conn, table, selected_data, task.report)
+            finally:
+                self.query_cache.invalidate(table)
 
+        def on_done(all_numbers):
             # หากเปิดใช้งานแทรกเบอร์เพิ่มเติม
-            if self.inject_extra_var.get() and self.inject_file_path:
+            if inject_file_path:
                 try:
-                    with open(self.inject_file_path, "r", encoding="utf-8") as f:
+                    with open(inject_file_path, "r", encoding="utf-8") as f:
                         injected_numbers = [line.strip()
                                             for line in f if line.strip()]
                     import random
@@ -584,15 +3350,21 @@ class PhoneDataManager:
                         "Error", f"เกิดข้อผิดพลาดขณะโหลดเบอร์เพิ่มเติม: {str(e)}")
                     return
 
-            # บันทึกเป็นไฟล์ .txt
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write("\n".join(all_numbers))
+            try:
+                # บันทึกเป็นไฟล์ .txt
+                with open(file_path, "w", encoding="utf-8") as f:
+                    f.write("\n".join(all_numbers))
+            except Exception as e:
+                messagebox.showerror("Export Error", str(e))
+                return
 
             messagebox.showinfo(
                 "สำเร็จ", f"ส่งออกทั้งหมด {len(all_numbers):,} เบอร์เรียบร้อยแล้ว\n\nบันทึกไว้ที่:\n{file_path}")
 
-        except Exception as e:
-            messagebox.showerror("Export Error", str(e))
+        self.run_db_task(work, on_done, "กำลังส่งออกข้อมูล...", f"กำลังส่งออก {total:,} เบอร์...",
+                         on_error=lambda e: messagebox.showerror("Export Error", str(e)),
+                         on_cancel=lambda: messagebox.showinfo(
+                             "ยกเลิกแล้ว", "ยกเลิกการส่งออกแล้ว (ไม่มีเบอร์ถูกตั้งว่าส่งออกแล้ว)"))
 
     def delete_selected_datasets(self):
         """ลบชุดข้อมูลทั้งหมดที่ถูกติ๊กออกจาก Table ที่เลือก"""
@@ -619,28 +3391,35 @@ class PhoneDataManager:
         if not confirm:
             return
 
-        try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-
-            # ลบข้อมูลตาม dataset_name ที่เลือก
-            for name in selected_names:
-                cursor.execute(
-                    f"DELETE FROM {table} WHERE dataset_name = ?",
-                    (name,),
-                )
-
-            conn.commit()
-            conn.close()
+        def work(task):
+            deleted = 0
+            try:
+                with self.db.writer() as conn, task.use(conn):
+                    cursor = conn.cursor()
 
+                    # ลบข้อมูลตาม dataset_name ที่เลือก
+                    for index, name in enumerate(selected_names, start=1):
+                        cursor.execute(
+                            f"DELETE FROM {table} WHERE {dataset_ids_sql()}",
+                            (name,),
+                        )
+                        deleted += cursor.rowcount
+                        task.report(index / len(selected_names) * 100,
+                                    f"ลบ {name} แล้ว (รวม {deleted:,} เบอร์)")
+                    delete_unused_datasets(cursor)
+            finally:
+                self.query_cache.invalidate(table)
+
+        def on_done(result):
             messagebox.showinfo(
                 "สำเร็จ", "ลบชุดข้อมูลที่เลือกเรียบร้อยแล้ว")
 
             # โหลดรายการชุดข้อมูลใหม่
             self.load_export_datasets()
 
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
+        self.run_db_task(work, on_done, "กำลังลบข้อมูล...", "กำลังลบชุดข้อมูลที่เลือก...",
+                         on_cancel=lambda: messagebox.showinfo(
+                             "ยกเลิกแล้ว", "ยกเลิกการลบแล้ว (ไม่มีชุดข้อมูลใดถูกลบ)"))
 
     def load_export_datasets(self, event=None):
         for widget in self.export_dataset_frame.winfo_children():
@@ -654,19 +3433,20 @@ class PhoneDataManager:
         self.export_entry_vars = {}
         self.export_warnings = {}
 
-        try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"""
-                SELECT dataset_name,
-                    COUNT(*) AS total,
-                    SUM(CASE WHEN is_exported = 0 THEN 1 ELSE 0 END) AS exportable
-                FROM {table}
-                GROUP BY dataset_name
-            """)
-            results = cursor.fetchall()
-            conn.close()
+        def work(task):
+            task.report(None, f"กำลังนับเบอร์ของแต่ละชุดข้อมูลใน {table}...")
+            with self.db.reader() as conn, task.use(conn):
+                return self.query_cache.get(
+                    conn, table, "export_counts", lambda conn: count_export_datasets(conn, table))
 
+        def on_done(results):
+            if table != self.export_table_var.get():
+                return
+            for widget in self.export_dataset_frame.winfo_children():
+                widget.destroy()
+            self.export_dataset_vars = {}
+            self.export_entry_vars = {}
+            self.export_warnings = {}
             for name, total, exportable in results:
                 row = tk.Frame(self.export_dataset_frame, bg="#ffffff")
                 row.pack(fill=tk.X, padx=10, pady=3)
@@ -690,8 +3470,7 @@ class PhoneDataManager:
                 self.export_entry_vars[name] = (entry, entry_var, exportable)
                 self.export_warnings[name] = warning
 
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
+        self.run_db_task(work, on_done, "กำลังโหลดชุดข้อมูล...", "กำลังโหลดชุดข้อมูลที่ส่งออกได้...")
 
     def toggle_export_input(self, name):
         var = self.export_dataset_vars[name]
@@ -724,64 +3503,66 @@ class PhoneDataManager:
         self.move_canvas.itemconfig(self.move_canvas_window, width=event.width)
 
     def export_selected_data(self):
-        selected = self.export_table.get_children()
+        selected = [self.export_table.item(row)["values"]
+                    for row in self.export_table.get_children()]
         data_type = self.export_data_type_var.get()
         only_new = self.only_new_export_var.get()
-        export_results = []
-
-        for row in selected:
-            dataset_name, table, total, export_count = self.export_table.item(row)[
-                "values"]
-            try:
-                export_count = int(export_count)
-            except:
-                continue
-            if export_count <= 0:
-                continue
 
+        def work(task):
+            export_results = []
             try:
-                conn = self.get_db_connection()
-                cursor = conn.cursor()
-                # ดึงเบอร์ที่ต้องการ
-                query = f"""
-                    SELECT id, phone_number FROM {table}
-                    WHERE dataset_name = ? AND data_type = ?
-                """
-                params = [dataset_name, data_type]
-                if only_new:
-                    query += " AND is_exported = 0"
-                query += f" LIMIT {export_count}"
-                params.append(export_count)
-                cursor.execute(query, params)
-                rows = cursor.fetchall()
-
-                # update is_exported = 1
-                ids = [row[0] for row in rows]
-                if ids:
-                    id_str = ",".join(str(i) for i in ids)
-                    cursor.execute(
-                        f"UPDATE {table} SET is_exported = 1 WHERE id IN ({id_str})")
-                    conn.commit()
-                    export_results.extend([row[1] for row in rows])
-
-                conn.close()
-            except Exception as e:
-                messagebox.showerror("Export Error", str(e))
-                return
+                # ใช้ connection เดียวทั้งรอบและ commit ครั้งเดียว แทนการเปิด connection ใหม่ทุกแถว
+                with self.db.writer() as conn, task.use(conn), \
+                        bulk_transaction(conn) as cursor:
+                    for dataset_name, table, total, export_count in selected:
+                        try:
+                            export_count = int(export_count)
+                        except:
+                            continue
+                        if export_count <= 0:
+                            continue
+
+                        # ดึงเบอร์ที่ต้องการ
+                        query = f"""
+                            SELECT id, {phone_sql()} FROM {table}
+                            WHERE {dataset_ids_sql("dataset_name = ? AND data_type = ?")}
+                        """
+                        params = [dataset_name, data_type]
+                        if only_new:
+                            query += " AND is_exported = 0"
+                        query += " LIMIT ?"
+                        params.append(export_count)
+                        cursor.execute(query, params)
+                        rows = cursor.fetchall()
+
+                        # update is_exported = 1
+                        cursor.executemany(
+                            f"UPDATE {table} SET is_exported = 1 WHERE id = ?",
+                            ((row[0],) for row in rows))
+                        export_results.extend([row[1] for row in rows])
+                        task.report(None, f"ส่งออกแล้ว {len(export_results):,} เบอร์")
+            finally:
+                # แต่ละแถวอาจมาจากคนละ Table
+                self.query_cache.invalidate()
+            return export_results
+
+        def on_done(export_results):
+            # บันทึกเป็นไฟล์ .txt
+            if export_results:
+                file_path = filedialog.asksaveasfilename(
+                    defaultextension=".txt", filetypes=[("Text Files", "*.txt")])
+                if file_path:
+                    with open(file_path, "w", encoding="utf-8") as f:
+                        f.write("\n".join(export_results))
+                    messagebox.showinfo(
+                        "Success", f"ส่งออก {len(export_results)} เบอร์เรียบร้อยแล้ว")
 
-        # บันทึกเป็นไฟล์ .txt
-        if export_results:
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".txt", filetypes=[("Text Files", "*.txt")])
-            if file_path:
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write("\n".join(export_results))
-                messagebox.showinfo(
-                    "Success", f"ส่งออก {len(export_results)} เบอร์เรียบร้อยแล้ว")
+            else:
+                messagebox.showwarning(
+                    "ไม่มีข้อมูล", "ไม่มีข้อมูลที่ตรงตามเงื่อนไขที่ต้องการส่งออก")
 
-        else:
-            messagebox.showwarning(
-                "ไม่มีข้อมูล", "ไม่มีข้อมูลที่ตรงตามเงื่อนไขที่ต้องการส่งออก")
+        self.run_db_task(work, on_done, "กำลังส่งออกข้อมูล...", "กำลังส่งออกเบอร์...",
+                         on_error=lambda e: messagebox.showerror("Export Error", str(e)))
 
     def toggle_inject_extra_file(self):
         if not self.inject_extra_var.get():
@@ -815,6 +3596,9 @@ class PhoneDataManager:
         self.search_phone_var = tk.StringVar()
         ttk.Entry(filter_frame, textvariable=self.search_phone_var,
                   width=20).pack(side=tk.LEFT, padx=5)
+        self.search_phone_match_var = tk.StringVar(value=MANAGE_PHONE_MATCH_LABELS[0])
+        ttk.Combobox(filter_frame, textvariable=self.search_phone_match_var, state="readonly",
+                     values=MANAGE_PHONE_MATCH_LABELS, width=10).pack(side=tk.LEFT)
 
         tk.Label(filter_frame, text="ชื่อชุดข้อมูล:", bg="#f0f2f5",
                  font=("Kanit", 10)).pack(side=tk.LEFT, padx=(10, 0))
@@ -842,6 +3626,8 @@ class PhoneDataManager:
             side=tk.LEFT, padx=10)
         ttk.Button(filter_frame, text="รีเซ็ต",
                    command=self.reset_manage_filters).pack(side=tk.LEFT)
+        ttk.Button(filter_frame, text="หาเบอร์ในทุก Table",
+                   command=self.show_phone_locations).pack(side=tk.LEFT, padx=(10, 0))
 
         # Treeview พร้อม scrollbar
         tree_container = tk.Frame(frame)
@@ -857,7 +3643,9 @@ class PhoneDataManager:
         # Scrollbars สำหรับ Treeview
         tree_scroll_y = ttk.Scrollbar(tree_container, orient="vertical", command=self.tree.yview)
         tree_scroll_x = ttk.Scrollbar(tree_container, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=tree_scroll_y.set, xscrollcommand=tree_scroll_x.set)
+        self.tree.configure(xscrollcommand=tree_scroll_x.set)
+        # แถวถูกดึงจากฐานข้อมูลทีละหน้าตามการเลื่อน (pager ตั้ง yscrollcommand เอง)
+        self.manage_pager = KeysetPager(self.tree, tree_scroll_y, self.run_db_task)
 
         # จัดวาง Treeview และ scrollbars
         self.tree.grid(row=0, column=0, sticky="nsew")
@@ -896,7 +3684,7 @@ class PhoneDataManager:
         # Top Left: เบอร์ซ้ำในฐานข้อมูล
         tk.Label(top_left_frame, text="เบอร์ซ้ำในฐานข้อมูล", bg="#ffffff",
                  fg="#1877f2", font=("Kanit", 12, "bold")).pack(pady=5)
-        self.duplicate_box = ScrolledText(
+        self.duplicate_box = VirtualListBox(
             top_left_frame, width=35, height=17, font=("Kanit", 9))
         self.duplicate_box.pack(padx=5, pady=(0, 2))
         self.duplicate_count_label = tk.Label(
@@ -911,7 +3699,7 @@ class PhoneDataManager:
         # Bottom Left: เบอร์ซ้ำในไฟล์
         tk.Label(bottom_left_frame, text="เบอร์ซ้ำกันเองในไฟล์", bg="#ffffff",
                  fg="#dc3545", font=("Kanit", 12, "bold")).pack(pady=5)
-        self.file_duplicate_box = ScrolledText(
+        self.file_duplicate_box = VirtualListBox(
             bottom_left_frame, width=35, height=17, font=("Kanit", 9))
         self.file_duplicate_box.pack(padx=5, pady=(0, 2))
         self.file_duplicate_count_label = tk.Label(
@@ -926,7 +3714,7 @@ class PhoneDataManager:
         # Right: All Numbers
         tk.Label(right_frame, text="เบอร์ที่จะนำเข้า", bg="#ffffff",
                  fg="#1877f2", font=("Kanit", 12, "bold")).pack(pady=10)
-        self.preview_box = ScrolledText(
+        self.preview_box = VirtualListBox(
             right_frame, width=35, height=35, font=("Kanit", 9))
         self.preview_box.pack(padx=5, pady=(0, 2))
         self.preview_count_label = tk.Label(
@@ -960,10 +3748,32 @@ class PhoneDataManager:
         self.create_labeled_combobox(center_frame, "เลือกชุดข้อมูล (Table)", "table_var", [
             f"phone_data_set_{i}" for i in range(1, 17)])
 
+        # โหมดไม่รับเบอร์ที่มีอยู่แล้วในทุก Table (ตรวจจากทะเบียนเบอร์กลาง)
+        self.reject_any_table_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            center_frame,
+            text="ข้ามเบอร์ที่มีอยู่แล้วใน Table ใดก็ได้",
+            variable=self.reject_any_table_var,
+            bg="#ffffff",
+            font=("Kanit", 10)
+        ).pack(pady=(0, 5))
+
+        # ไฟล์ใหญ่เกินหน่วยความจำ: ไม่โหลดตัวอย่าง ตรวจเบอร์ซ้ำด้วยการเรียงบนดิสก์ตอนบันทึก
+        self.external_sort_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            center_frame,
+            text="ไฟล์ใหญ่มาก (เรียงเบอร์บนดิสก์ ไม่แสดงตัวอย่าง)",
+            variable=self.external_sort_var,
+            bg="#ffffff",
+            font=("Kanit", 10)
+        ).pack(pady=(0, 5))
+
         ttk.Button(center_frame, text="เลือกไฟล์เบอร์โทร (.txt)",
                    command=self.load_files).pack(pady=(10, 5))
         ttk.Button(center_frame, text="บันทึกลงฐานข้อมูล",
-                   command=self.save_to_database).pack(pady=(5, 10))
+                   command=self.save_to_database).pack(pady=(5, 5))
+        ttk.Button(center_frame, text="นำเข้าต่อจากงานที่ค้าง",
+                   command=self.resume_import_jobs).pack(pady=(5, 10))
 
     def create_labeled_entry(self, parent, label_text, attr_name, default=""):
         tk.Label(parent, text=label_text, bg="#ffffff",
@@ -991,180 +3801,113 @@ class PhoneDataManager:
         setattr(self, attr_name, textarea)
 
     def load_files(self):
-        self.file_paths = filedialog.askopenfilenames(
-            filetypes=[("Text Files", "*.txt")])
-        self.phone_numbers = []
-
-        self.preview_box.delete("1.0", tk.END)
-        self.duplicate_box.delete("1.0", tk.END)
-        self.file_duplicate_box.delete("1.0", tk.END)
-        # รีเซ็ตจำนวนในแต่ละกล่อง
-        if hasattr(self, "duplicate_count_label"):
-            self.duplicate_count_label.config(text="แสดง 0 เบอร์")
-        if hasattr(self, "file_duplicate_count_label"):
-            self.file_duplicate_count_label.config(text="แสดง 0 เบอร์")
-        if hasattr(self, "preview_count_label"):
-            self.preview_count_label.config(text="แสดง 0 เบอร์")
+        self.file_paths = filedialog.askopenfilenames(filetypes=PHONE_FILE_TYPES)
+        self.show_import_preview(ImportPreview())
 
         if not self.file_paths:
             return
 
-        # Progress Window
-        progress_window = tk.Toplevel(self.root)
-        progress_window.title("กำลังโหลดไฟล์เบอร์โทร...")
-        progress_window.geometry("400x100")
-        progress_window.resizable(False, False)
-        tk.Label(progress_window, text="กำลังอ่านและวิเคราะห์ไฟล์...",
-                 font=("Kanit", 10)).pack(pady=(10, 5))
-
-        progress_var = tk.DoubleVar()
-        progress_bar = ttk.Progressbar(
-            progress_window, maximum=100, variable=progress_var)
-        progress_bar.pack(fill=tk.X, padx=20, pady=5)
-
-        progress_status = tk.Label(progress_window, text="", font=("Kanit", 9))
-        progress_status.pack()
-        progress_window.update()
-
-        # Step 1: Load and normalize numbers
-        raw_numbers = []
-        total_lines = sum(
-            1 for path in self.file_paths for _ in open(path, encoding='utf-8'))
+        if self.external_sort_var.get():
+            self.show_import_preview(ImportPreview(file_paths=list(self.file_paths)))
+            size = sum(os.path.getsize(path) for path in self.file_paths)
+            self.preview_count_label.config(
+                text=f"{len(self.file_paths)} ไฟล์ ({size / 1048576:,.1f} MB) ตรวจเบอร์ซ้ำตอนบันทึก")
+            return
 
-        count = 0
-        for file_path in self.file_paths:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                for line in file:
-                    phone = line.strip()
-                    phone = self.normalize_phone(phone)
-                    if phone:
-                        raw_numbers.append(phone)
-                    count += 1
-                    progress_percent = (count / total_lines) * 30  # 30% weight
-                    progress_var.set(progress_percent)
-                    progress_status.config(
-                        text=f"กำลังโหลด {count} / {total_lines} บรรทัด")
-                    progress_window.update()
+        file_paths = list(self.file_paths)
+        table = self.table_var.get()
+        check_all_tables = self.reject_any_table_var.get()
+
+        def work(task):
+            # stat ก่อนอ่าน ถ้าไฟล์ถูกแก้ระหว่าง/หลังอ่าน ตอนบันทึกจะไม่ใช้ผลตรวจเบอร์ซ้ำนี้
+            sources = stat_source_files(file_paths)
+            # Step 1-2: อ่านไฟล์ (หลาย process ถ้าไฟล์ใหญ่) แปลงเบอร์ และหาเบอร์ซ้ำในไฟล์ (50%)
+            raw_numbers, _, internal_duplicates = parse_phone_files(
+                file_paths, lambda percent, text: task.report(percent * 0.5, text))
+
+            # Step 3: ตรวจเบอร์ซ้ำในฐานข้อมูลด้วย join ครั้งเดียว (50%)
+            duplicates = PhoneArray()
+            db_check = None
+            db_error = None
+            if table:
+                task.report(50, "กำลังตรวจสอบเบอร์ซ้ำในฐานข้อมูล...")
+                try:
+                    with self.db.writer() as conn, task.use(conn):
+                        duplicates, version = find_db_duplicates(
+                            conn, table, raw_numbers, check_all_tables,
+                            lambda percent, text: task.report(50 + percent * 0.5, text))
+                    db_check = (table, check_all_tables, version)
+                except Exception as e:
+                    if task.cancelled:
+                        raise
+                    db_error = e
 
-        self.phone_numbers = raw_numbers
-        self.preview_box.insert(tk.END, "\n".join(self.phone_numbers))
+            return ImportPreview(raw_numbers, internal_duplicates, duplicates, db_check,
+                                 file_paths, sources), db_error
 
-        # อัปเดตจำนวนเบอร์ในกล่องแสดงตัวอย่าง
-        self.update_import_counts()
+        def on_done(result):
+            preview, db_error = result
 
-        # Step 2: Check duplicates in file (weight 20%)
-        progress_status.config(text="กำลังตรวจสอบเบอร์ซ้ำในไฟล์...")
-        progress_window.update()
-        self.find_internal_duplicates()
-        progress_var.set(50)
-        progress_window.update()
+            self.show_import_preview(preview)
 
-        # Step 3: Check duplicates in DB (weight 50%)
-        table = self.table_var.get()
-        if table:
-            progress_status.config(text="กำลังตรวจสอบเบอร์ซ้ำในฐานข้อมูล...")
-            progress_window.update()
-            self.duplicate_box.delete("1.0", tk.END)
-            duplicates = []
+            if db_error is not None:
+                messagebox.showerror("Database Error", str(db_error))
 
-            try:
-                conn = self.get_db_connection()
-                cursor = conn.cursor()
-
-                total = len(self.phone_numbers)
-                batch_size = 1000
-                for i in range(0, total, batch_size):
-                    batch = self.phone_numbers[i:i+batch_size]
-                    if not batch:
-                        continue
-                    format_strings = ','.join(['?'] * len(batch))
-                    query = f'SELECT phone_number FROM "{table}" WHERE phone_number IN ({format_strings})'
-                    cursor.execute(query, batch)
-                    result = cursor.fetchall()
-                    duplicates.extend([row[0] for row in result])
-
-                    percent = 50 + ((i + len(batch)) / total) * \
-                        50  # จาก 50 ถึง 100
-                    progress_var.set(percent)
-                    progress_status.config(
-                        text=f"ตรวจสอบแล้ว {i + len(batch)} / {total} เบอร์")
-                    progress_window.update()
+        self.run_db_task(work, on_done, "กำลังโหลดไฟล์เบอร์โทร...", "กำลังอ่านและวิเคราะห์ไฟล์...",
+                         on_error=lambda e: messagebox.showerror("Error", str(e)))
 
-                conn.close()
-                self.duplicate_box.insert(tk.END, "\n".join(duplicates))
-                # อัปเดตจำนวนเบอร์ซ้ำในฐานข้อมูล
-                self.update_import_counts()
-            except Exception as e:
-                progress_window.destroy()
-                messagebox.showerror("Database Error", str(e))
-                return
-
-        progress_window.destroy()
+    def show_import_preview(self, preview):
+        """เปลี่ยนเบอร์ที่รอนำเข้าเป็น preview แล้วแสดงในกล่องทั้ง 3 พร้อมจำนวน"""
+        self.import_preview = preview
+        self.preview_box.set_items(preview.numbers)
+        self.duplicate_box.set_items(preview.db_duplicates)
+        self.file_duplicate_box.set_items(preview.file_duplicates)
+        self.update_import_counts()
 
-    def find_internal_duplicates(self):
-        self.file_duplicate_box.delete("1.0", tk.END)
-        counter = Counter(self.phone_numbers)
-        internal_duplicates = [num for num,
-                               count in counter.items() if count > 1]
-        self.file_duplicate_box.insert(tk.END, "\n".join(internal_duplicates))
+    def find_internal_duplicates(self, internal_duplicates=None):
+        preview = self.import_preview
+        if internal_duplicates is None:
+            internal_duplicates = preview.numbers.repeated()
+        preview.file_duplicates = internal_duplicates
+        self.file_duplicate_box.set_items(internal_duplicates)
         # อัปเดตจำนวนเบอร์ซ้ำในไฟล์
         self.update_import_counts()
 
     def update_import_counts(self):
-        """อัปเดตจำนวนเบอร์ใน 3 กล่องของแท็บนำเข้าข้อมูล"""
-        try:
-            # นับจากข้อมูลในแต่ละกล่อง
-            preview_text = self.preview_box.get("1.0", tk.END).strip()
-            preview_count = len(preview_text.splitlines()) if preview_text else 0
-
-            dup_db_text = self.duplicate_box.get("1.0", tk.END).strip()
-            dup_db_count = len(dup_db_text.splitlines()) if dup_db_text else 0
-
-            dup_file_text = self.file_duplicate_box.get("1.0", tk.END).strip()
-            dup_file_count = len(dup_file_text.splitlines()) if dup_file_text else 0
-
-            if hasattr(self, "preview_count_label"):
-                self.preview_count_label.config(text=f"แสดง {preview_count} เบอร์")
-            if hasattr(self, "duplicate_count_label"):
-                self.duplicate_count_label.config(text=f"แสดง {dup_db_count} เบอร์")
-            if hasattr(self, "file_duplicate_count_label"):
-                self.file_duplicate_count_label.config(text=f"แสดง {dup_file_count} เบอร์")
-        except Exception:
-            # ไม่ต้องให้โปรแกรมล้ม ถ้ามีปัญหาในการอ่านค่า
-            pass
+        """อัปเดตจำนวนเบอร์ใน 3 กล่องของแท็บนำเข้าข้อมูล (นับจาก import_preview)"""
+        preview = self.import_preview
+        self.preview_count_label.config(text=f"แสดง {len(preview.numbers)} เบอร์")
+        self.duplicate_count_label.config(text=f"แสดง {len(preview.db_duplicates)} เบอร์")
+        self.file_duplicate_count_label.config(
+            text=f"แสดง {len(preview.file_duplicates)} เบอร์")
 
     def show_duplicates_preview(self):
         table = self.table_var.get()
-        self.duplicate_box.delete("1.0", tk.END)
-        duplicates = []
+        check_all_tables = self.reject_any_table_var.get()
+        preview = self.import_preview
 
-        try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
+        def work(task):
+            with self.db.writer() as conn, task.use(conn):
+                return find_db_duplicates(
+                    conn, table, preview.numbers, check_all_tables, task.report)
 
-            for phone in self.phone_numbers:
-                cursor.execute(
-                    f"SELECT COUNT(*) FROM {table} WHERE phone_number = ?", (phone,))
-                if cursor.fetchone()[0] > 0:
-                    duplicates.append(phone)
+        def on_done(result):
+            duplicates, version = result
+            preview.db_duplicates = duplicates
+            preview.db_check = (table, check_all_tables, version)
+            self.duplicate_box.set_items(duplicates)
+            self.update_import_counts()
 
-            conn.close()
-            self.duplicate_box.insert(tk.END, "\n".join(duplicates))
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
+        self.run_db_task(work, on_done, "กำลังตรวจสอบเบอร์ซ้ำ...",
+                         "กำลังตรวจสอบเบอร์ซ้ำในฐานข้อมูล...")
 
     def normalize_phone(self, phone):
-        phone = re.sub(r'[^\d+]', '', phone)
-        if phone.startswith('+66'):
-            phone = '0' + phone[3:]
-        elif phone.startswith('66'):
-            phone = '0' + phone[2:]
-        elif not phone.startswith('0'):
-            phone = '0' + phone[-9:]
-        return phone if re.match(r'^0\d{9}$', phone) else None
+        return normalize_phone(phone)
 
     def save_to_database(self):
-        if not hasattr(self, 'phone_numbers') or not self.phone_numbers:
+        external_sort = self.external_sort_var.get()
+        preview = self.import_preview
+        if not preview.numbers and not (external_sort and preview.file_paths):
             messagebox.showerror("Error", "กรุณาเลือกไฟล์และโหลดเบอร์ก่อน")
             return
 
@@ -1190,110 +3933,136 @@ class PhoneDataManager:
             messagebox.showerror("Error", "กรุณากรอกชื่อชุดข้อมูล")
             return
 
-        try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-
-            progress_window = tk.Toplevel(self.root)
-            progress_window.title("กำลังบันทึกข้อมูล...")
-            progress_window.geometry("400x100")
-            progress_window.resizable(False, False)
-            tk.Label(progress_window, text="กำลังนำเข้าข้อมูล กรุณารอสักครู่...", font=("Kanit", 10)).pack(pady=(10, 5))
-
-            progress_var = tk.DoubleVar()
-            progress_bar = ttk.Progressbar(progress_window, maximum=100, variable=progress_var)
-            progress_bar.pack(fill=tk.X, padx=20, pady=5)
-
-            progress_status = tk.Label(progress_window, text="", font=("Kanit", 9))
-            progress_status.pack()
-            progress_window.update()
-
-            cursor.execute(f'SELECT phone_number FROM "{table}"')
-            existing_numbers = set(row[0] for row in cursor.fetchall())
+        times = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        dataset = (dataset_name, receive_date, source, detail, data_type, times)
+        file_paths = self.import_preview.file_paths
+        check_all_tables = self.reject_any_table_var.get()
+        # ผลตรวจเบอร์ซ้ำตอนโหลดไฟล์ (ใช้ซ้ำได้ถ้าทั้งไฟล์และฐานข้อมูลยังไม่เปลี่ยน)
+        known_duplicates = self.import_preview.known_duplicates(table, check_all_tables)
+
+        def on_saved():
+            self.show_import_preview(ImportPreview())
+
+        if external_sort:
+            self.run_import_task(
+                lambda conn, report: import_phone_files_external(
+                    conn, file_paths, table, dataset, report, check_all_tables),
+                table, on_saved)
+            return
+        self.run_import_task(
+            lambda conn, report: import_phone_files(conn, file_paths, table, dataset, report,
+                                                   check_all_tables, known_duplicates),
+            table, on_saved)
+
+    def resume_import_jobs(self, startup=False):
+        """ถามว่าจะนำเข้าต่อหรือยกเลิกงานนำเข้าที่ค้างอยู่ (งานล่าสุดก่อน)"""
+        def work(task):
+            with self.db.reader() as conn, task.use(conn):
+                return list_import_jobs(conn)
+
+        self.run_db_task(work, lambda jobs: self.ask_resume_import_job(jobs, startup))
+
+    def ask_resume_import_job(self, jobs, startup=False):
+        if not jobs:
+            if not startup:
+                messagebox.showinfo("Info", "ไม่มีงานนำเข้าที่ค้างอยู่")
+            return
 
-            # นับจำนวนเบอร์แต่ละหมายเลขในไฟล์
-            from collections import Counter
-            phone_counter = Counter(self.phone_numbers)
-            
-            new_entries = []  # เบอร์ไม่ซ้ำ (ครั้งแรก) ไปใน Table ปกติ
-            duplicate_entries = []  # เบอร์ซ้ำ (ครั้งที่ 2, 3, ...) ไปใน Table 16
-            db_duplicates = []  # เบอร์ที่มีในฐานข้อมูลแล้ว
-            times = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            processed_phones = set()  # เก็บเบอร์ที่เคยประมวลผลแล้ว
-            
-            for phone in self.phone_numbers:
-                if phone in existing_numbers:
-                    # เบอร์มีในฐานข้อมูลอยู่แล้ว
-                    db_duplicates.append(phone)
-                elif phone not in processed_phones:
-                    # เบอร์ครั้งแรก (ไม่ซ้ำ) ไปใน Table ปกติ
-                    new_entries.append((
-                        phone, dataset_name, receive_date, source, detail, data_type, times, 0
-                    ))
-                    processed_phones.add(phone)
-                    
-                    # ถ้าเบอร์นี้ซ้ำในไฟล์ เก็บส่วนที่ซ้ำไป Table 16
-                    duplicate_count = phone_counter[phone] - 1  # ลบ 1 ครั้งแรก
-                    for _ in range(duplicate_count):
-                        duplicate_entries.append((
-                            phone, dataset_name, receive_date, source, detail, data_type, times, 0
-                        ))
-                # หากเบอร์ซ้ำในไฟล์และผ่านการประมวลผลแล้ว จะถูกข้ามไป
-
-            # บันทึกเบอร์ไม่ซ้ำลง Table ปกติ
-            total = len(new_entries)
-            if total > 0:
-                batch_size = 1000
-                for i in range(0, total, batch_size):
-                    batch = new_entries[i:i + batch_size]
-                    cursor.executemany(f"""
-                        INSERT INTO {table} 
-                        (phone_number, dataset_name, receive_date, source, detail, data_type, created_at, is_exported)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, batch)
-                    conn.commit()
-
-                    percent = ((i + len(batch)) / total) * 50  # 50% สำหรับ Table ปกติ
-                    progress_var.set(percent)
-                    progress_status.config(text=f"นำเข้า Table ปกติ {i + len(batch)} / {total} เบอร์")
-                    progress_window.update()
-
-            # บันทึกเบอร์ซ้ำลง Table 16
-            total_dup = len(duplicate_entries)
-            if total_dup > 0:
-                batch_size = 1000
-                for i in range(0, total_dup, batch_size):
-                    batch = duplicate_entries[i:i + batch_size]
-                    cursor.executemany("""
-                        INSERT INTO phone_data_set_16 
-                        (phone_number, dataset_name, receive_date, source, detail, data_type, created_at, is_exported)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, batch)
-                    conn.commit()
-
-                    percent = 50 + ((i + len(batch)) / total_dup) * 50  # 50-100%
-                    progress_var.set(percent)
-                    progress_status.config(text=f"นำเข้า Table 16 (ซ้ำ) {i + len(batch)} / {total_dup} เบอร์")
-                    progress_window.update()
+        job_id, dataset_name, table, byte_offset, bytes_total, phone_count = jobs[0][:6]
+        percent = byte_offset / bytes_total * 100 if bytes_total else 100
+        if jobs[0][10] == "failed":
+            # ไฟล์บีบอัดเสีย ทำต่อไม่ได้ เหลือแค่ยกเลิกงาน
+            if not messagebox.askyesno(
+                    "งานนำเข้าที่อ่านไฟล์ไม่สำเร็จ",
+                    f"งานนำเข้า #{job_id} ชุดข้อมูล '{dataset_name}' → {table}\n"
+                    f"อ่านไฟล์ไม่สำเร็จที่ {percent:.0f}% ({phone_count} เบอร์) นำเข้าต่อไม่ได้\n\n"
+                    f"ยกเลิกงานและลบเบอร์ที่นำเข้าไปแล้วหรือไม่?"):
+                return
+            answer = False
+        else:
+            answer = messagebox.askyesnocancel(
+                "งานนำเข้าที่ค้างอยู่",
+                f"พบงานนำเข้า #{job_id} ชุดข้อมูล '{dataset_name}' → {table}\n"
+                f"นำเข้าไปแล้ว {percent:.0f}% ({phone_count} เบอร์)\n\n"
+                f"Yes = นำเข้าต่อ\n"
+                f"No = ยกเลิกงานและลบเบอร์ที่นำเข้าไปแล้ว\n"
+                f"Cancel = ไว้ทีหลัง"
+            )
+        if answer is None:
+            return
+        if answer:
+            self.run_import_task(
+                lambda conn, report: run_import_job(conn, job_id, report), table)
+            return
 
-            conn.close()
-            progress_window.destroy()
+        def work(task):
+            try:
+                with self.db.writer() as conn, task.use(conn):
+                    return discard_import_job(conn, job_id)
+            finally:
+                self.query_cache.invalidate(table, DUPLICATE_TABLE)
+
+        self.run_db_task(
+            work,
+            lambda deleted: messagebox.showinfo(
+                "Success", f"ยกเลิกงานนำเข้า #{job_id} แล้ว (ลบ {deleted} เบอร์)"),
+            "กำลังยกเลิกงานนำเข้า...", f"กำลังลบเบอร์ของงานนำเข้า #{job_id}...")
+
+    def run_import_task(self, start_import, table, on_saved=None):
+        """รัน start_import(conn, report) ด้วย writer ใน background พร้อมหน้าต่าง progress
+
+        start_import นำเข้าเบอร์ลง table (และ Table 16) ต้องคืนค่า
+        (new_count, duplicate_count, db_duplicate_count) ถ้าถูกยกเลิกหรือล้มกลางทาง
+        checkpoint ที่ commit แล้วยังอยู่ และงานนำเข้าทำต่อได้ภายหลัง
+        """
+        # มีงานนำเข้าค้างให้ทำต่อหรือไม่ (ตรวจใน worker หลังงานล้ม/ถูกยกเลิก)
+        state = {"resumable": False}
+        resume_hint = ("เบอร์ที่นำเข้าไปแล้วถูกบันทึกไว้ "
+                       "กด 'นำเข้าต่อจากงานที่ค้าง' เพื่อทำต่อจากจุดเดิม")
+
+        def work(task):
+            try:
+                with self.db.writer() as conn, task.use(conn):
+                    return start_import(conn, task.report)
+            except Exception:
+                try:
+                    with self.db.reader() as conn:
+                        state["resumable"] = any(job[10] == "running"
+                                                 for job in list_import_jobs(conn))
+                except sqlite3.Error:
+                    pass
+                raise
+            finally:
+                # checkpoint ที่ commit ไปแล้วยังอยู่แม้งานล้มกลางทาง
+                self.query_cache.invalidate(table, DUPLICATE_TABLE)
+
+        def on_done(result):
+            new_count, duplicate_count, db_duplicate_count = result
 
             messagebox.showinfo(
                 "Success",
                 f"บันทึกข้อมูลเรียบร้อยแล้ว\n"
-                f"นำเข้า Table ปกติ: {len(new_entries)} เบอร์\n"
-                f"นำเข้า Table 16 (ซ้ำในไฟล์): {len(duplicate_entries)} เบอร์\n"
-                f"ซ้ำในฐานข้อมูล (ข้าม): {len(db_duplicates)} เบอร์"
+                f"นำเข้า Table ปกติ: {new_count} เบอร์\n"
+                f"นำเข้า Table 16 (ซ้ำในไฟล์): {duplicate_count} เบอร์\n"
+                f"ซ้ำในฐานข้อมูล (ข้าม): {db_duplicate_count} เบอร์"
             )
+            if on_saved:
+                on_saved()
 
-            self.preview_box.delete("1.0", tk.END)
-            self.duplicate_box.delete("1.0", tk.END)
-            self.file_duplicate_box.delete("1.0", tk.END)
+        def on_error(error):
+            message = str(error)
+            if state["resumable"]:
+                message += "\n\n" + resume_hint
+            messagebox.showerror("Database Error", message)
 
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
+        def on_cancel():
+            message = "ยกเลิกการนำเข้าแล้ว"
+            if state["resumable"]:
+                message += "\n\n" + resume_hint
+            messagebox.showinfo("ยกเลิกแล้ว", message)
+
+        self.run_db_task(work, on_done, "กำลังบันทึกข้อมูล...",
+                         "กำลังนำเข้าข้อมูล กรุณารอสักครู่...", on_error, on_cancel)
 
     def setup_duplicate_tab(self):
         frame = tk.Frame(self.tab_duplicate, bg="#f0f2f5")
@@ -1350,27 +4119,14 @@ class PhoneDataManager:
     def load_duplicate_numbers(self):
         table = "phone_data_set_16"
 
-        try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
+        def work(task):
+            with self.db.reader() as conn, task.use(conn):
+                return self.query_cache.get(
+                    conn, DUPLICATE_TABLE, "duplicates",
+                    lambda conn: find_duplicate_numbers(conn, task.report))
 
-            # Query จำนวนเบอร์ทั้งหมด (DISTINCT)
-            cursor.execute(f"""
-                SELECT COUNT(DISTINCT phone_number) as total_phones
-                FROM {table}
-            """)
-            total_phones = cursor.fetchone()[0]
-
-            # Query เบอร์ที่ซ้ำจาก Table 16
-            cursor.execute(f"""
-                SELECT phone_number, COUNT(*) as count
-                FROM {table}
-                GROUP BY phone_number
-                HAVING count > 1
-                ORDER BY count DESC, phone_number
-            """)
-            duplicates = cursor.fetchall()
-            conn.close()
+        def on_done(result):
+            total_phones, duplicates = result
 
             # ล้างข้อมูลเก่า
             for item in self.duplicate_tree.get_children():
@@ -1386,8 +4142,7 @@ class PhoneDataManager:
             self.duplicate_count_label.config(
                 text=f"แสดงเบอร์ซ้ำ: {len(duplicates):,} เบอร์")
 
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
+        self.run_db_task(work, on_done, "กำลังค้นหาเบอร์ซ้ำ...", "กำลังสรุปเบอร์ซ้ำใน Table 16...")
 
     def export_duplicates_to_csv(self):
         table = "phone_data_set_16"
@@ -1462,22 +4217,14 @@ class PhoneDataManager:
         if not confirm:
             return
         
-        try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-
-            # ลบเบอร์ทั้งหมดที่เลือกจาก phone_data_set_16
-            total_deleted = 0
-            for phone in phones_to_delete:
-                cursor.execute(
-                    "DELETE FROM phone_data_set_16 WHERE phone_number = ?",
-                    (phone,)
-                )
-                total_deleted += cursor.rowcount
-
-            conn.commit()
-            conn.close()
+        def work(task):
+            try:
+                with self.db.writer() as conn, task.use(conn):
+                    return delete_duplicate_numbers(conn, phones_to_delete, task.report)
+            finally:
+                self.query_cache.invalidate(DUPLICATE_TABLE)
 
+        def on_done(total_deleted):
             messagebox.showinfo(
                 "สำเร็จ", 
                 f"ลบเบอร์เรียบร้อยแล้ว\n\n"
@@ -1488,12 +4235,307 @@ class PhoneDataManager:
             # รีเฟรช tree view
             self.load_duplicate_numbers()
 
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
+        self.run_db_task(work, on_done, "กำลังลบเบอร์...", "กำลังลบเบอร์ที่เลือกจาก Table 16...",
+                         on_cancel=lambda: messagebox.showinfo(
+                             "ยกเลิกแล้ว", "ยกเลิกการลบแล้ว (ไม่มีเบอร์ใดถูกลบ)"))
+
+
+def print_progress(percent, text=""):
+    """แสดง progress ทีละบรรทัดบน stdout ให้อ่านจาก log ของ cron ได้ (percent เป็น None ถ้ายังไม่รู้ยอดรวม)"""
+    print(f"{'':6} {text}" if percent is None else f"{percent:5.1f}% {text}", flush=True)
+
+
+def _table_arg(value):
+    """รับชื่อ Table เป็นเลข 1-16 หรือชื่อเต็ม phone_data_set_N"""
+    name = f"phone_data_set_{value}" if value.isdigit() else value
+    if name not in PHONE_TABLES:
+        raise argparse.ArgumentTypeError(f"ไม่มี Table: {value} (ใช้ 1-16)")
+    return name
+
+
+def _date_arg(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"วันที่ต้องอยู่ในรูปแบบ YYYY-MM-DD: {value}")
+
+
+def _export_selection_arg(value):
+    """รับ NAME=COUNT ของคำสั่ง export"""
+    name, sep, count = value.rpartition("=")
+    if not sep or not name or not count.isdigit() or int(count) <= 0:
+        raise argparse.ArgumentTypeError(f"ต้องอยู่ในรูปแบบ ชื่อชุดข้อมูล=จำนวน: {value}")
+    return name, int(count)
+
+
+def _print_import_result(conn, job_id):
+    for job in list_import_jobs(conn, unfinished_only=False):
+        if job[0] == job_id:
+            phone_count, rejected_count, new_count, duplicate_count, db_duplicate_count = job[5:10]
+            print(f"อ่านได้ {phone_count:,} เบอร์ (ข้ามบรรทัดที่ไม่ใช่เบอร์ {rejected_count:,} บรรทัด)")
+            print(f"นำเข้า Table ปกติ: {new_count} เบอร์")
+            print(f"นำเข้า Table 16 (ซ้ำในไฟล์): {duplicate_count} เบอร์")
+            print(f"ซ้ำในฐานข้อมูล (ข้าม): {db_duplicate_count} เบอร์")
+
+
+def _resume_hint():
+    print("ความคืบหน้าถึง checkpoint ล่าสุดถูกบันทึกไว้ ดูงานที่ค้างด้วยคำสั่ง jobs "
+          "แล้วทำต่อด้วย resume JOB_ID", file=sys.stderr)
+
+
+def cli_import(db, args):
+    times = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    dataset = (args.dataset, args.receive_date, args.source, args.detail, args.data_type, times)
+    if args.memory_budget:
+        with db.writer() as conn:
+            new_count, duplicate_count, db_duplicate_count = import_phone_files_external(
+                conn, args.files, args.table, dataset, print_progress, args.reject_any_table,
+                args.memory_budget * 1024 * 1024, args.temp_dir)
+        print(f"นำเข้า Table ปกติ: {new_count} เบอร์")
+        print(f"นำเข้า Table 16 (ซ้ำในไฟล์): {duplicate_count} เบอร์")
+        print(f"ซ้ำในฐานข้อมูล (ข้าม): {db_duplicate_count} เบอร์")
+        return 0
+    try:
+        with db.writer() as conn:
+            # แสดงผลของงานที่สร้างเอง (cron หรือหน้าจออาจนำเข้างานอื่นพร้อมกัน)
+            job_id, _ = create_import_job(conn, args.files, args.table, dataset,
+                                          args.reject_any_table)
+            run_import_job(conn, job_id, print_progress)
+    except (KeyboardInterrupt, sqlite3.Error):
+        _resume_hint()
+        raise
+    with db.reader() as conn:
+        _print_import_result(conn, job_id)
+    return 0
+
+
+def cli_jobs(db, args):
+    with db.reader() as conn:
+        jobs = list_import_jobs(conn, unfinished_only=not args.all)
+    if not jobs:
+        print("ไม่มีงานนำเข้าที่ค้างอยู่" if not args.all else "ยังไม่มีงานนำเข้า")
+        return 0
+    for (job_id, dataset_name, table, byte_offset, bytes_total, phone_count, _,
+         new_count, duplicate_count, _, status, updated_at) in jobs:
+        percent = byte_offset / bytes_total * 100 if bytes_total else 100
+        print(f"#{job_id}\t{status}\t{percent:5.1f}%\t{table}\t{dataset_name}\t"
+              f"อ่าน {phone_count:,} / ใหม่ {new_count:,} / Table 16 {duplicate_count:,}\t{updated_at}")
+    return 0
+
+
+def cli_resume(db, args):
+    try:
+        with db.writer() as conn:
+            run_import_job(conn, args.job_id, print_progress)
+    except (KeyboardInterrupt, sqlite3.Error):
+        _resume_hint()
+        raise
+    with db.reader() as conn:
+        _print_import_result(conn, args.job_id)
+    return 0
+
+
+def cli_discard_job(db, args):
+    with db.writer() as conn:
+        deleted = discard_import_job(conn, args.job_id)
+    print(f"ยกเลิกงานนำเข้า #{args.job_id} แล้ว (ลบ {deleted} เบอร์)")
+    return 0
+
+
+def cli_export(db, args):
+    with db.writer() as conn:
+        numbers = export_phone_numbers(conn, args.table, args.dataset)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write("\n".join(numbers))
+    print(f"ส่งออกทั้งหมด {len(numbers):,} เบอร์ ไปที่ {args.output}")
+    return 0
+
+
+def cli_move(db, args):
+    if args.source == args.dest:
+        print("Error: ต้นทางและปลายทางต้องไม่ใช่ Table เดียวกัน", file=sys.stderr)
+        return 2
+    with db.writer() as conn:
+        total_moved = move_datasets(conn, args.source, args.dest, args.dataset,
+                                    args.delete_source, print_progress)
+    action = "ย้าย" if args.delete_source else "คัดลอก"
+    print(f"{action}ข้อมูลเรียบร้อยแล้ว ({total_moved} เบอร์)")
+    return 0
+
+
+def cli_duplicates(db, args):
+    if args.delete:
+        phones = [normalize_phone(phone) or phone for phone in args.delete]
+        with db.writer() as conn:
+            total_deleted = delete_duplicate_numbers(conn, phones)
+        print(f"ลบเบอร์ {len(phones)} เบอร์ออกจาก Table 16 ({total_deleted} แถว)")
+        return 0
+
+    with db.reader() as conn:
+        total_phones, duplicates = find_duplicate_numbers(conn)
+    print(f"เบอร์ทั้งหมดใน Table 16: {total_phones:,} เบอร์")
+    print(f"เบอร์ซ้ำ: {len(duplicates):,} เบอร์")
+    if args.csv:
+        with open(args.csv, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["เบอร์ที่ซ้ำ", "จำนวนการซ้ำ"])
+            writer.writerows(duplicates)
+        print(f"บันทึก CSV ที่ {args.csv}")
+    else:
+        for phone, count in duplicates:
+            print(f"{phone}\t{count}")
+    return 0
+
+
+def cli_phone_storage(db, args):
+    with db.writer() as conn:
+        convert_phone_storage(conn, args.mode, print_progress)
+    return 0
+
+
+def cli_bench_normalize(db, args):
+    benchmark_normalize(args.lines)
+    return 0
+
+
+def _prefix_mix_arg(value):
+    try:
+        weights = tuple(float(part) for part in value.split(","))
+    except ValueError:
+        weights = ()
+    if len(weights) != 3 or min(weights) < 0 or sum(weights) <= 0:
+        raise argparse.ArgumentTypeError("ต้องเป็นน้ำหนัก 3 ค่าของ 0,66,+66 เช่น 0.6,0.2,0.2")
+    return weights
+
+
+def cli_bench_import(db, args):
+    report = benchmark_import(args.lines, args.table_rows, args.duplicate_ratio,
+                              args.invalid_ratio, args.prefix_mix, args.workdir, args.seed,
+                              lambda text: print(text, flush=True))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    for run in report["runs"]:
+        seconds = run["seconds"]
+        print(f"{run['lines']:>12,} บรรทัด / table {run['table_rows']:>12,} แถว: "
+              f"โหลด {seconds['load_files_parse']:.2f} s, ตรวจซ้ำใน DB {seconds['db_dedup']:.2f} s, "
+              f"บันทึก {seconds['save_import_job']:.2f} s")
+    print(f"บันทึกผลที่ {args.output}")
+    return 0
+
+
+def build_cli_parser():
+    parser = argparse.ArgumentParser(
+        prog="data-mange_SQLite.py",
+        description="Phone Data Manager แบบ command line (ไม่ระบุคำสั่งจะเปิดหน้าต่างโปรแกรม)")
+    parser.add_argument("--db", default=DB_PATH, help=f"ไฟล์ฐานข้อมูล (ค่าเริ่มต้น {DB_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("import", help="นำเข้าเบอร์จากไฟล์ .txt (หรือ .gz/.xz/.zip)")
+    p.add_argument("files", nargs="+", help="ไฟล์เบอร์ (1 เบอร์ต่อบรรทัด) หรือไฟล์บีบอัด")
+    p.add_argument("--table", type=_table_arg, required=True, help="Table ปลายทาง (1-16)")
+    p.add_argument("--dataset", required=True, help="ชื่อชุดข้อมูล")
+    p.add_argument("--receive-date", type=_date_arg,
+                   default=datetime.now().strftime("%Y-%m-%d"), help="วันที่ได้รับเบอร์ YYYY-MM-DD")
+    p.add_argument("--source", default="", help="แหล่งที่มา")
+    p.add_argument("--detail", default="", help="รายละเอียด")
+    p.add_argument("--data-type", default="องค์กร", help="ประเภทข้อมูล (องค์กร/ภายนอก)")
+    p.add_argument("--reject-any-table", action="store_true",
+                   help="ข้ามเบอร์ที่มีอยู่แล้วใน Table ใดก็ได้ (ไม่ใช่แค่ Table ปลายทาง)")
+    p.add_argument("--memory-budget", type=int, metavar="MB",
+                   help="ไฟล์ใหญ่เกินหน่วยความจำ: ตรวจเบอร์ซ้ำด้วยการเรียงบนดิสก์ "
+                        "ใช้หน่วยความจำเรียงไม่เกิน MB (ไม่เป็นงานนำเข้าที่ทำต่อได้)")
+    p.add_argument("--temp-dir", help="โฟลเดอร์สำหรับไฟล์ run ของ --memory-budget")
+    p.set_defaults(handler=cli_import)
+
+    p = commands.add_parser("jobs", help="แสดงงานนำเข้าที่ค้างอยู่")
+    p.add_argument("--all", action="store_true", help="แสดงงานที่เสร็จแล้วด้วย")
+    p.set_defaults(handler=cli_jobs)
+
+    p = commands.add_parser("resume", help="นำเข้าต่อจาก checkpoint ล่าสุดของงานที่ค้าง")
+    p.add_argument("job_id", type=int)
+    p.set_defaults(handler=cli_resume)
+
+    p = commands.add_parser("discard-job", help="ยกเลิกงานนำเข้าที่ค้างและลบเบอร์ที่นำเข้าไปแล้ว")
+    p.add_argument("job_id", type=int)
+    p.set_defaults(handler=cli_discard_job)
+
+    p = commands.add_parser("export", help="ส่งออกเบอร์เป็นไฟล์ .txt และตั้งสถานะว่าส่งออกแล้ว")
+    p.add_argument("--table", type=_table_arg, required=True)
+    p.add_argument("--dataset", type=_export_selection_arg, action="append", required=True,
+                   metavar="NAME=COUNT", help="ชุดข้อมูลและจำนวนที่ต้องการ (ระบุซ้ำได้)")
+    p.add_argument("--output", required=True, help="ไฟล์ .txt ที่จะบันทึก")
+    p.set_defaults(handler=cli_export)
+
+    p = commands.add_parser("move", help="ย้าย/คัดลอกชุดข้อมูลระหว่าง Table")
+    p.add_argument("--from", dest="source", type=_table_arg, required=True)
+    p.add_argument("--to", dest="dest", type=_table_arg, required=True)
+    p.add_argument("--dataset", action="append", required=True, help="ชื่อชุดข้อมูล (ระบุซ้ำได้)")
+    p.add_argument("--delete-source", action="store_true", help="ลบข้อมูลต้นทางหลังย้าย")
+    p.set_defaults(handler=cli_move)
+
+    p = commands.add_parser("duplicates", help="แสดง/ส่งออก/ลบเบอร์ซ้ำใน Table 16")
+    p.add_argument("--csv", help="บันทึกรายการเบอร์ซ้ำเป็น CSV แทนการพิมพ์ออกหน้าจอ")
+    p.add_argument("--delete", nargs="+", metavar="PHONE", help="ลบทุกแถวของเบอร์เหล่านี้จาก Table 16")
+    p.set_defaults(handler=cli_duplicates)
+
+    p = commands.add_parser("phone-storage", help="แปลงโหมดการเก็บเบอร์ (สำรองไฟล์ก่อน)")
+    p.add_argument("mode", choices=sorted(PHONE_COLUMN_TYPES))
+    p.set_defaults(handler=cli_phone_storage)
+
+    p = commands.add_parser("bench-normalize", help="วัดความเร็วการแปลงเบอร์")
+    p.add_argument("lines", nargs="?", type=int, default=10_000_000)
+    p.set_defaults(handler=cli_bench_normalize)
+
+    p = commands.add_parser("bench-import", help="วัดเวลาแต่ละขั้นตอนของการนำเข้าด้วยไฟล์จำลอง")
+    p.add_argument("--lines", type=int, nargs="+", default=[100_000, 1_000_000],
+                   help="จำนวนบรรทัดของไฟล์จำลอง (ระบุได้หลายขนาด)")
+    p.add_argument("--table-rows", type=int, nargs="+", default=[0, 1_000_000],
+                   help="จำนวนเบอร์ที่มีอยู่แล้วใน table ปลายทาง (ระบุได้หลายขนาด)")
+    p.add_argument("--duplicate-ratio", type=float, default=0.1,
+                   help="สัดส่วนบรรทัดเบอร์ที่ซ้ำกับเบอร์ก่อนหน้าในไฟล์")
+    p.add_argument("--invalid-ratio", type=float, default=0.02, help="สัดส่วนบรรทัดที่ไม่ใช่เบอร์")
+    p.add_argument("--prefix-mix", type=_prefix_mix_arg, default=(0.6, 0.2, 0.2),
+                   metavar="W0,W66,W+66", help="น้ำหนักของรูปแบบเบอร์ 0 / 66 / +66")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--workdir", help="โฟลเดอร์สำหรับไฟล์จำลองและฐานข้อมูลชั่วคราว")
+    p.add_argument("--output", default="bench_import.json", help="ไฟล์ JSON ของผลการวัด")
+    p.set_defaults(handler=cli_bench_import)
+    return parser
+
+
+def run_cli(argv):
+    """รันคำสั่ง command line คืนค่า exit code: 0 สำเร็จ, 1 error, 2 ใช้คำสั่งผิด, 130 ถูกยกเลิก"""
+    args = build_cli_parser().parse_args(argv)
+    if args.command in ("bench-normalize", "bench-import"):
+        return args.handler(None, args)
+    db = None
+    try:
+        create_phone_data_tables(args.db)
+        db = ConnectionManager(args.db)
+        return args.handler(db, args)
+    except KeyboardInterrupt:
+        print("ยกเลิกแล้ว", file=sys.stderr)
+        return 130
+    except (sqlite3.Error, OSError, ValueError) + DECOMPRESS_ERRORS as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if db is not None:
+            db.close()
 
 
 if __name__ == "__main__":
+    # จำเป็นสำหรับ process pool ตอนรันเป็นไฟล์ EXE (PyInstaller)
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+
+    if tk is None:
+        print(f"เปิดหน้าจอไม่ได้ ({_GUI_IMPORT_ERROR}) ติดตั้ง tkinter และ tkcalendar "
+              f"หรือใช้คำสั่ง command line (ดู --help)", file=sys.stderr)
+        sys.exit(1)
     create_phone_data_tables()
     root = tk.Tk()
     app = PhoneDataManager(root)
     root.mainloop()
+    app.close()